@@ -1,127 +1,1027 @@
 import sys
 import time
-from collections import defaultdict
 
 # Running script: given code can be run with the command:
 # python file.py ./path/to/init_state.txt ./output/output.txt
 
 import collections
+import random
+
+# Domains are bitmasks: bit (value - 1) is set iff value is still allowed.
+# Tables over every mask are built eagerly up to this many masks (9x9 needs 512) and filled
+# lazily, one mask at a time, for larger grids where 2 ** side entries would not fit.
+EAGER_TABLE_LIMIT = 1 << 12
+
+
+# dict that computes missing entries with `function`; indexed exactly like the eager lists
+class LazyTable(dict):
+
+    def __init__(self, function):
+        dict.__init__(self)
+        self.function = function
+
+    def __missing__(self, key):
+        value = self[key] = self.function(key)
+        return value
+
+
+def make_mask_table(function, mask_count):
+    if mask_count <= EAGER_TABLE_LIMIT:
+        return [function(mask) for mask in range(mask_count)]
+    return LazyTable(function)
+
+
+# returns a tuple of the cell's neighbours (assigned or not): 20 for a 9x9 grid.
+def get_neighbours(cell, box_size=3):
+    neighbours = []
+    side = box_size * box_size
+    (row, col) = divmod(cell, side)
+
+    for i in range(0, side):
+        if i != row:
+            neighbours.append(i * side + col)
+        if i != col:
+            neighbours.append(row * side + i)
+
+    start_row = (row // box_size) * box_size
+    start_col = (col // box_size) * box_size
+    for current_row in range(start_row, start_row + box_size):
+        for current_col in range(start_col, start_col + box_size):
+            if current_col == col or current_row == row:
+                continue  # exclude same row and col
+            else:
+                neighbours.append(current_row * side + current_col)
+
+    return tuple(neighbours)
+
+
+# Geometry and lookup tables of a sudoku with (box_size x box_size) boxes, i.e. a
+# side x side grid with side = box_size ** 2 and values 1..side. Built once per box size by
+# get_grid and shared by every Sudoku instance of that size.
+class Grid(object):
+
+    def __init__(self, box_size):
+        n = box_size
+        side = n * n
+        self.box_size = n
+        self.side = side
+        self.cell_count = side * side
+
+        self.values = range(1, side + 1)
+        self.all_values = (1 << side) - 1
+        self.value_bit = [0] + [1 << (value - 1) for value in self.values]
+        mask_count = self.all_values + 1
+        self.popcount = make_mask_table(lambda mask: bin(mask).count("1"), mask_count)
+        self.lowest_value = make_mask_table(lambda mask: (mask & -mask).bit_length(), mask_count)
+        self.mask_values = make_mask_table(
+            lambda mask: [value for value in range(1, side + 1) if mask >> (value - 1) & 1], mask_count)
+
+        # Cells are numbered in row-major order: cell = row * side + col.
+        self.cells = range(self.cell_count)
+        self.row_units = [[row * side + col for col in range(side)] for row in range(side)]
+        self.col_units = [[row * side + col for row in range(side)] for col in range(side)]
+        self.box_units = [[((box // n) * n + row) * side + (box % n) * n + col for row in range(n) for col in range(n)]
+                          for box in range(side)]
+        self.units = self.row_units + self.col_units + self.box_units
+        self.row_of = [cell // side for cell in self.cells]
+        self.col_of = [cell % side for cell in self.cells]
+        self.box_of = [(cell // side // n) * n + (cell % side) // n for cell in self.cells]
+        # cell_units[cell] is (row unit, column unit, box unit) of that cell.
+        self.cell_units = [(self.row_units[self.row_of[cell]], self.col_units[self.col_of[cell]],
+                            self.box_units[self.box_of[cell]]) for cell in self.cells]
+        # Value supports are counted per (unit, value) at index unit * support_stride + value, with
+        # the units numbered as in `units`. cell_support_offsets[cell] holds the three unit offsets.
+        self.support_stride = side + 1
+        self.cell_support_offsets = [(self.row_of[cell] * self.support_stride,
+                                      (side + self.col_of[cell]) * self.support_stride,
+                                      (2 * side + self.box_of[cell]) * self.support_stride)
+                                     for cell in self.cells]
+        # peers[cell] holds the neighbours of every cell
+        self.peers = [get_neighbours(cell, n) for cell in self.cells]
+
+        # Every trail entry clears at least one of the cell_count * side domain bits on the current path.
+        self.trail_size = self.cell_count * side
+        self.dancing_links = None
+
+    # pickles as a reference to the shared instance instead of copying the tables
+    def __reduce__(self):
+        return (get_grid, (self.box_size,))
+
+    # Exact-cover encoding: row (cell * side + value - 1) places value in cell and covers 4 of
+    # the 4 * side * side columns: the cell itself, (row, value), (col, value) and (box, value).
+    def get_exact_cover_columns(self, cell, value):
+        side = self.side
+        cell_count = self.cell_count
+        return (cell,
+                cell_count + self.row_of[cell] * side + value - 1,
+                2 * cell_count + self.col_of[cell] * side + value - 1,
+                3 * cell_count + self.box_of[cell] * side + value - 1)
+
+    # Dancing links for an empty grid as flat lists, built on first use. Node 0 is the root,
+    # the next 4 * side * side nodes are column headers and every exact-cover row owns 4
+    # consecutive nodes after that. Returns (left, right, up, down, column, size); DancingLinks
+    # copies them per puzzle.
+    def get_dancing_links(self):
+        if self.dancing_links is not None:
+            return self.dancing_links
+        column_count = 4 * self.cell_count
+        node_count = 1 + column_count + self.cell_count * self.side * 4
+        left = [0] * node_count
+        right = [0] * node_count
+        up = list(range(node_count))
+        down = list(range(node_count))
+        column = list(range(node_count))
+        size = [0] * (1 + column_count)
+
+        for header in range(1 + column_count):
+            left[header] = header - 1 if header > 0 else column_count
+            right[header] = header + 1 if header < column_count else 0
+
+        node = 1 + column_count
+        for cell in self.cells:
+            for value in self.values:
+                first = node
+                for constraint in self.get_exact_cover_columns(cell, value):
+                    header = 1 + constraint
+                    # append at the bottom of the column
+                    column[node] = header
+                    up[node] = up[header]
+                    down[node] = header
+                    down[up[header]] = node
+                    up[header] = node
+                    size[header] += 1
+                    # link into the row's circular list
+                    left[node] = node - 1 if node > first else first + 3
+                    right[node] = node + 1 if node < first + 3 else first
+                    node += 1
+
+        self.dancing_links = (left, right, up, down, column, size)
+        return self.dancing_links
+
+
+GRIDS = {}
+
+
+# returns the shared Grid for a box size, building it on first use
+def get_grid(box_size):
+    if box_size not in GRIDS:
+        GRIDS[box_size] = Grid(box_size)
+    return GRIDS[box_size]
+
+
+# box size of a side x side puzzle, e.g. 3 for 9x9 and 4 for 16x16
+def get_box_size(side):
+    box_size = int(round(side ** 0.5))
+    if box_size < 1 or box_size * box_size != side:
+        raise ValueError("A sudoku grid must be n^2 x n^2, got {0} rows".format(side))
+    return box_size
+
+
+# the standard 9x9 tables are built at import and shared by every 9x9 solver
+STANDARD_GRID = get_grid(3)
+
+
+ENGINES = ("csp", "dlx")
+# Strategies of the csp engine, selected by name; each name maps to the Sudoku method that implements it.
+# Variable orderings pick and remove the next cell from the unassigned ones.
+VARIABLE_ORDERINGS = collections.OrderedDict([
+    ("first", "first_unassigned_variable"),
+    ("mrv", "most_constrained_variable"),
+    ("mrv+degree", "most_constrained_variable"),  # with degree_tie_break
+    ("dom/wdeg", "weighted_degree_variable"),
+])
+# Variable orderings that read degrees kept up to date as cells are assigned, with the method
+# called as update(cell, -1) on assignment and update(cell, 1) when the cell is unassigned again.
+DEGREE_UPDATES = {
+    "mrv+degree": "update_degrees",
+    "dom/wdeg": "update_weighted_degrees",
+}
+# Value orderings list the values of the chosen cell in the order they are tried.
+VALUE_ORDERINGS = collections.OrderedDict([
+    ("identity", "identity_domain"),
+    ("lcv", "least_constraining_value"),
+])
+# Inferences prune the domains of unassigned cells after every assignment; [] on a wipe-out.
+INFERENCES = collections.OrderedDict([
+    ("none", "no_inference"),
+    ("fc", "forward_checking"),
+    ("fc-singleton", "singleton_inference"),
+    ("mac", "arc_consistency_inference"),
+])
+# Propagation stages, cheapest first; each one is a Sudoku method of the same name.
+PROPAGATION_STAGES = ("naked_singles", "hidden_singles", "naked_pairs", "hidden_pairs", "pointing")
+# the stages that read the (unit, value) supports; they are only kept up to date for these
+SUPPORT_STAGES = ("hidden_singles", "hidden_pairs", "pointing")
+
+
+# The Luby sequence 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8, ... at `index` (from 0)
+def luby(index):
+    size = 1
+    power = 0
+    while size < index + 1:  # the smallest complete prefix 2 ** (power + 1) - 1 long that holds index
+        power += 1
+        size = 2 * size + 1
+    while size - 1 != index:
+        size = (size - 1) // 2
+        power -= 1
+        index %= size
+    return 1 << power
+
+
+# 1, 1, 2, 3, 5, 7, 11, 17, ...: grows by half each time
+def geometric(index):
+    return int(1.5 ** index)
+
+
+# Restart schedules of the csp engine: run i (from 0) of a restarting search gives up after
+# restart_base * schedule(i) nodes and starts over from the root with new random tie-breaks.
+RESTART_SCHEDULES = collections.OrderedDict([
+    ("none", None),
+    ("luby", luby),
+    ("geometric", geometric),
+])
+
+
+# Per-solve counters and phase timings, reset whenever a search starts:
+#   nodes               search nodes expanded (the same number as `counter`)
+#   backtracks          nodes whose values all failed, so the search returned to the parent
+#   backjumps           backtracks that went back more than one level (backjumping only)
+#   restarts            runs of a restarting search that hit their node limit
+#   prunings            domain reductions recorded on the trail, including at the root
+#   propagation_rounds  calls of a propagation stage
+#   max_depth           deepest search stack
+#   preprocess_seconds  building domains, buckets and supports (placing givens for dlx)
+#   ac_seconds          arc consistency and propagation at the root
+#   search_seconds      time spent in backtrack, summed over resumes
+def new_stats():
+    return {"nodes": 0, "backtracks": 0, "backjumps": 0, "restarts": 0, "prunings": 0, "propagation_rounds": 0, "max_depth": 0,
+            "preprocess_seconds": 0.0, "ac_seconds": 0.0, "search_seconds": 0.0}
+
+
+# checks that `name` is a key of one of the strategy tables above
+def check_strategy(kind, name, strategies):
+    if name not in strategies:
+        raise ValueError("Unknown {0} {1!r}, expected one of {2}".format(kind, name, tuple(strategies)))
 
 
 class Sudoku(object):
-    counter = 0
-    adjacency_dict = {}
+    adjacency_dict = STANDARD_GRID.peers
 
-    def __init__(self, puzzle):
+    def __init__(self, puzzle, degree_tie_break=False, verbose=True, engine="csp", propagation=(),
+                 inference="fc", variable_ordering="mrv", value_ordering="lcv", on_node=None,
+                 backjumping=False, seed=None, restarts="none", restart_base=1000, cache=None):
         # you may add more attributes if you need
         self.puzzle = puzzle  # self.puzzle is a list of lists
+        # number of search nodes of this instance's current solve
+        self.counter = 0
+        self.stats = new_stats()
+        # called as on_node(sudoku, cell, depth) whenever the csp engine expands a node
+        self.on_node = on_node
         # self.ans = copy.deepcopy(puzzle) # self.ans is a list of lists
+        # the box size follows from the puzzle: 9 rows is 3x3 boxes, 16 rows 4x4 boxes, ...
+        self.bind_grid(get_grid(get_box_size(len(puzzle))))
+        grid = self.grid
+        if engine not in ENGINES:
+            raise ValueError("Unknown engine {0!r}, expected one of {1}".format(engine, ENGINES))
+        # "csp" is the backtracking search below, "dlx" is the exact-cover DancingLinks search
+        self.engine = engine
+        # names from VARIABLE_ORDERINGS, VALUE_ORDERINGS and INFERENCES; the methods are looked up
+        # when the search starts, so a paused solver still pickles
+        check_strategy("variable ordering", variable_ordering, VARIABLE_ORDERINGS)
+        check_strategy("value ordering", value_ordering, VALUE_ORDERINGS)
+        check_strategy("inference", inference, INFERENCES)
+        if degree_tie_break and variable_ordering == "mrv":
+            variable_ordering = "mrv+degree"
+        self.variable_ordering = variable_ordering
+        self.value_ordering = value_ordering
+        self.inference = inference
+        # names from PROPAGATION_STAGES to run to a fixpoint at the root and after every inference
+        for stage in propagation:
+            if stage not in PROPAGATION_STAGES:
+                raise ValueError("Unknown propagation stage {0!r}, expected one of {1}".format(
+                    stage, PROPAGATION_STAGES))
+        self.propagation = tuple(stage for stage in PROPAGATION_STAGES if stage in propagation)
+        self.propagation_stages = [getattr(self, stage) for stage in self.propagation]
+        # Counting supports costs three updates per value on every pruning and restore, more than
+        # LCV saves by reading them, so they are only counted when a propagation stage needs them.
+        self.track_supports = any(stage in SUPPORT_STAGES for stage in self.propagation)
+        # Conflict-directed backjumping: a node whose values all failed returns straight to the
+        # deepest assignment that took part in one of the failures. The conflicts are read off
+        # which assigned peers hold the values of a wiped-out domain, which only explains the
+        # wipe-out when forward checking is the only thing that prunes.
+        if backjumping and (inference != "fc" or self.propagation):
+            raise ValueError("Backjumping needs inference 'fc' and no propagation stages")
+        self.backjumping = backjumping
+        # With a seed, MRV and LCV break ties at random, reproducibly for the same seed. A name from
+        # RESTART_SCHEDULES makes search() start over whenever a run exceeds its node limit, so one
+        # bad early choice cannot take the whole solve; restarts imply random ties (seed 0 if none).
+        check_strategy("restart schedule", restarts, RESTART_SCHEDULES)
+        if restarts != "none":
+            if restart_base < 1:
+                raise ValueError("restart_base must be at least 1, got {0}".format(restart_base))
+            # without random ties every run would replay the same search
+            if variable_ordering not in ("mrv", "mrv+degree") and value_ordering != "lcv":
+                raise ValueError("Restarts need random ties: variable ordering 'mrv' or 'mrv+degree', or value ordering 'lcv'")
+            if seed is None:
+                seed = 0
+        self.rng = None if seed is None else random.Random(seed)
+        self.restarts = restarts
+        self.restart_base = restart_base
+        # solve() asks this first, e.g. a cache.SolutionCache of puzzles equivalent under symmetry
+        self.cache = cache
+        # batch runs turn this off so that the backtrack count does not interleave with solutions
+        self.verbose = verbose
+        # MRV breaks ties between equally small domains by the number of unassigned peers
+        self.degree_tie_break = variable_ordering == "mrv+degree"
+        # dom/wdeg weighs every peer constraint by the wipe-outs it caused
+        self.constraint_weighting = variable_ordering == "dom/wdeg"
+        # undo log of (cell, old domain) pairs, popped back to a saved mark on backtracking
+        self.trail_cells = [0] * grid.trail_size
+        self.trail_domains = [0] * grid.trail_size
+        self.trail_top = 0
+        # Unassigned cells are threaded through one doubly linked list per domain size 0..side.
+        # bucket_of[cell] is the size the cell is filed under, or -1 once it is assigned.
+        self.bucket_heads = [-1] * (grid.side + 1)
+        self.bucket_next = [-1] * grid.cell_count
+        self.bucket_prev = [-1] * grid.cell_count
+        self.bucket_of = [-1] * grid.cell_count
+        # degrees[cell] is the number of unassigned peers; only kept up to date for degree_tie_break
+        self.degrees = [0] * grid.cell_count
+        # weights[cell][i] is the weight of the constraint between cell and its i-th peer, and
+        # weighted_degrees[cell] the summed weights towards unassigned peers; dom/wdeg only
+        self.weights = []
+        self.weighted_degrees = [0] * grid.cell_count
+        # supports[unit * support_stride + value] is the number of cells in the unit whose domain
+        # holds value; only kept up to date for track_supports
+        self.supports = [0] * (len(grid.units) * grid.support_stride)
+
+    # keeps the grid tables used in the hot loops as attributes of the solver
+    def bind_grid(self, grid):
+        self.grid = grid
+        self.adjacency_dict = grid.peers
+        self.value_bit = grid.value_bit
+        self.popcount = grid.popcount
+        self.mask_values = grid.mask_values
+        self.cell_support_offsets = grid.cell_support_offsets
+
+    # A paused solver pickles without the grid tables and bound propagation stages (neither
+    # pickles under Python 2, and the tables are shared anyway); both are rebuilt on load.
+    # The cache is shared between solvers and is left out too.
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ("adjacency_dict", "value_bit", "popcount", "mask_values", "cell_support_offsets",
+                     "propagation_stages", "cache"):
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.bind_grid(self.grid)
+        self.propagation_stages = [getattr(self, stage) for stage in self.propagation]
+        self.cache = None
 
     def solve(self):
         # TODO: Write your code here
-        state = self.puzzle
-        self.adjacency_dict = self.get_adjacency_dict(state)
-        unassigned_positions = self.get_unassigned_positions(state)
-        domains = self.preprocess_domains(state)
+        result = self.search() if self.cache is None else self.cache.solve(self)
+        assert result != [], "Did not solve puzzle."
+        self.ans = self.unflatten(result)
 
-        # Preprocess domains with AC3
-        deque = self.make_arc_deque(self.get_assigned_positions(state), unassigned_positions)
-        domains = self.forward_checking_singleton(deque, domains)
-        self.ans = self.backtrack(state, domains, unassigned_positions)
-        assert self.ans != [], "Did not solve puzzle."
-
-        print("Backtrack was called {0} times".format(self.counter))
+        if self.verbose:
+            print("Backtrack was called {0} times".format(self.counter))
 
         # self.ans is a list of lists
         return self.ans
 
+    # runs the selected engine to the end; returns the solved flat state or [] on failure.
+    # `counter` holds the number of search nodes and `stats` the other counters either way.
+    def search(self):
+        if self.engine == "dlx":
+            dancing_links = DancingLinks(self.flatten(self.puzzle), self.grid)
+            result = dancing_links.search()
+            self.counter = dancing_links.counter
+            self.stats = dancing_links.stats
+            return result
+        self.prepare()
+        if self.restarts != "none":
+            return self.restarting_search()
+        return self.backtrack()
+
+    # backtrack with node limits from the restart schedule; returns the solved state or [] on failure
+    def restarting_search(self):
+        schedule = RESTART_SCHEDULES[self.restarts]
+        run = 0
+        while True:
+            result = self.backtrack(self.restart_base * schedule(run))
+            if result is not None:
+                return result
+            run += 1
+            self.stats["restarts"] += 1
+            self.unwind(0)
+            self.expanding = True
+
+    # Yields the solutions of the puzzle as flat states, at most `limit` of them (None for all),
+    # with the selected engine. The search only runs on when the next solution is asked for,
+    # and each state is the solver's own list rather than a copy: read it before asking for
+    # the next one. `counter` and `stats` cover the whole enumeration so far. The enumeration is
+    # one complete search, so it never restarts; random tie-breaks only change the order.
+    def each_solution(self, limit=None):
+        if limit is not None and limit < 1:
+            raise ValueError("Solution limit must be at least 1, got {0}".format(limit))
+        if self.engine == "dlx":
+            dancing_links = DancingLinks(self.flatten(self.puzzle), self.grid)
+            self.stats = dancing_links.stats
+            solutions = dancing_links.solutions()
+        else:
+            dancing_links = None
+            solutions = self.csp_solutions()
+        count = 0
+        while limit is None or count < limit:
+            state = next(solutions, None)
+            if dancing_links is not None:
+                self.counter = dancing_links.counter
+            if state is None:
+                return
+            count += 1
+            yield state
+
+    def csp_solutions(self):
+        self.prepare()
+        while self.backtrack():
+            yield self.state
+            self.skip_solution()
+
+    # yields every solution as a new list of lists; see each_solution
+    def solutions(self, limit=None):
+        for state in self.each_solution(limit):
+            yield self.unflatten(state)
+
+    # Number of solutions of the puzzle, counting no further than `limit` (None for all of
+    # them); count_solutions(2) == 1 checks that a puzzle is proper. Nothing is copied per
+    # solution, so counting runs at the node rate of a normal search.
+    def count_solutions(self, limit=None):
+        count = 0
+        for state in self.each_solution(limit):
+            count += 1
+        return count
+
+    # After backtrack returned a solution, undoes its last assignment so that the next
+    # backtrack call carries on with the remaining values and returns the next solution.
+    def skip_solution(self):
+        if self.stack:
+            (variable, values, index, mark, conflicts) = self.stack[-1]
+            self.restore_domains(self.domains, mark)
+            self.state[variable] = 0
+            # The branch above every frame held a solution, so no frame may be jumped over any
+            # more: each one conflicts with all the frames below it.
+            for depth, frame in enumerate(self.stack):
+                frame[4] = (1 << depth) - 1
+
+    # sets up the search state on the instance so that `backtrack` can be paused and resumed
+    def prepare(self):
+        start = time.time()
+        self.counter = 0
+        self.stats = new_stats()
+        self.state = self.flatten(self.puzzle)
+        self.unassigned_positions = self.get_unassigned_positions(self.state)
+        self.domains = self.preprocess_domains(self.state)
+        self.trail_top = 0
+        grid = self.grid
+        self.bucket_heads = [-1] * (grid.side + 1)
+        self.bucket_of = [-1] * grid.cell_count
+        for cell in reversed(grid.cells):  # linked at the head, so buckets start out in cell order
+            if self.state[cell] == 0:
+                self.link(cell, self.popcount[self.domains[cell]])
+        if self.degree_tie_break:
+            self.degrees = [self.get_degree(cell, self.unassigned_positions) for cell in grid.cells]
+        if self.constraint_weighting:
+            # every weight starts at 1, so the weighted degrees start out as the degrees
+            self.weights = [[1] * len(grid.peers[cell]) for cell in grid.cells]
+            self.weighted_degrees = [self.get_degree(cell, self.unassigned_positions) for cell in grid.cells]
+        self.supports = [0] * (len(grid.units) * grid.support_stride)
+        if self.track_supports:
+            for cell in grid.cells:
+                self.update_supports(cell, self.domains[cell], 1)
+        # explicit search stack; each frame is [variable, ordered values, next value index, trail mark,
+        # conflicts], conflicts being a bitmask of the depths of the frames its failures depend on
+        self.stack = []
+        # depth_of[cell] is the stack index of the frame that assigned cell; -1 for the givens
+        self.depth_of = [-1] * grid.cell_count
+        # True when the next step of the search is to expand a new node
+        self.expanding = True
+        end = time.time()
+        self.stats["preprocess_seconds"] = end - start
+
+        # Preprocess domains with AC3
+        start = end
+        assigned_positions = self.get_assigned_positions(self.state)
+        deque = self.make_arc_deque(assigned_positions, self.unassigned_positions)
+        for position in assigned_positions:
+            if not self.is_value_consistent(self.state[position], position, self.state):
+                self.expanding = False  # two givens clash; arcs only run from givens to empty cells
+        if not self.forward_checking_singleton(deque, self.domains) or not self.propagate(self.domains):
+            self.expanding = False  # givens are inconsistent; backtrack reports failure right away
+        self.stats["ac_seconds"] = time.time() - start
+        self.stats["prunings"] = self.trail_top
+        # the domains every search node starts from, to explain wipe-outs for backjumping
+        self.root_domains = self.domains[:]
+
+    # turns the side x side list of lists into a flat list indexed by cell
+    def flatten(self, puzzle):
+        return [value for row in puzzle for value in row]
+
+    def unflatten(self, state):
+        side = self.grid.side
+        return [state[row * side:row * side + side] for row in range(side)]
+
     # excludes assigned variables
     def preprocess_domains(self, state):
-        initial_domains = {}
-
-        for row in range(9):
-            for col in range(9):
-                value = state[row][col]
-                if value == 0:
-                    # initial_domains[(row, col)] = [state[row][col]]
-                    initial_domains[(row, col)] = set(range(1,10))
-                else:
-                    initial_domains[(row, col)] = set([value])
-        return initial_domains
+        value_bit = self.value_bit
+        all_values = self.grid.all_values
+        return [value_bit[value] if value else all_values for value in state]
 
     def get_assigned_positions(self, state):
-        assigned_positions = []
-
-        for row in range(9):
-            for col in range(9):
-                position = (row, col)
-                value = state[row][col]
-                if value != 0:
-                    assigned_positions.append(position)
-
-        return assigned_positions
-
-    # `assignment` is the same as state, as it is represented as a 9x9 2D matrix
-    # `domains` is a dictionary. Key is position. Value is a set of allowable sudoku values.
-    def backtrack(self, state, domains, unassigned_positions):
-        self.counter += 1
-        if not unassigned_positions:
-            return state
+        return [cell for cell in self.grid.cells if state[cell] != 0]
 
-        variable = self.most_constrained_variable(unassigned_positions, domains)
-        # variable = self.first_unassigned_variable(unassigned_positions)
-        row = variable[0]
-        col = variable[1]
-        removed = defaultdict(set)
-
-        for value in self.least_constraining_value(variable, domains):
-            if self.is_value_consistent(value, variable, state):
-                state[row][col] = value  # assignment
-                original_variable_domain = domains[variable]  # cannot add into `removed` as removed is strictly for inference
-                domains[variable] = set([value])
-
-                # `inferences` are reduced domains of variables
-                ##### Variant 1 - MAC ######
-                # if self.mac(self.make_arc_deque([variable], unassigned_positions), domains, removed):  # not failure
-                ##### Variant 2 - FC ######
-                if self.forward_checking(domains, variable, value, removed):
-                ##### Variant 3 - FC singleton ######
-                # if self.forward_checking_singleton(self.make_arc_deque([variable], unassigned_positions), domains, removed):
-                    result = self.backtrack(state, domains, unassigned_positions)
-                    # successful result is a complete assignment
-                    # failure is an empty list
-                    if result:  # not failure
-                        return result
-                # restoring inferences
-                self.restore_removed_domains(domains, removed)
-                domains[variable] = original_variable_domain
-            state[row][col] = 0
-
-        assert type(variable) == tuple, "variable must be tuple"
-        unassigned_positions.add(variable)
-        return []  # failure
-
-    def restore_removed_domains(self, domains, removed):
-        for position in removed:
-            domains[position] |= removed[position]
-
-    def first_unassigned_variable(self, unassigned_positions):
-        return unassigned_positions.pop()
-
-    # returns the unassigned position (row, col) 
+    # Depth-first search over an explicit stack instead of recursion.
+    # `state` is a flat list of cells (the assignment).
+    # `domains` is a list indexed by cell. Value is a bitmask of allowable sudoku values.
+    # Returns the solved state, [] on failure, or None once `max_nodes` nodes have been
+    # expanded by this call; calling it again resumes where it stopped. All search state
+    # lives in plain lists on the instance, so a paused solver can be pickled as a checkpoint.
+    def backtrack(self, max_nodes=None):
+        start = time.time()
+        result = self.depth_first_search(max_nodes)
+        self.stats["search_seconds"] += time.time() - start
+        self.stats["nodes"] = self.counter
+        return result
+
+    # the search loop behind backtrack; the counters live in locals and are saved on every return
+    def depth_first_search(self, max_nodes):
+        state = self.state
+        domains = self.domains
+        unassigned_positions = self.unassigned_positions
+        stack = self.stack
+        expanding = self.expanding
+        value_bit = self.value_bit
+        popcount = self.popcount
+        select_variable = getattr(self, VARIABLE_ORDERINGS[self.variable_ordering])
+        order_values = getattr(self, VALUE_ORDERINGS[self.value_ordering])
+        infer = getattr(self, INFERENCES[self.inference])
+        # options are resolved into locals once per call instead of read off self on every node
+        update_degrees = self.get_degree_update()
+        propagate = self.propagate if self.propagation_stages else None
+        on_node = self.on_node
+        backjumping = self.backjumping
+        constraint_weighting = self.constraint_weighting
+        explain_failures = backjumping or constraint_weighting
+        depth_of = self.depth_of
+        stats = self.stats
+        (backtracks, backjumps, prunings, max_depth) = (stats["backtracks"], stats["backjumps"], stats["prunings"],
+                                                        stats["max_depth"])
+        nodes = 0
+
+        while True:
+            if expanding:
+                if max_nodes is not None and nodes >= max_nodes:
+                    self.expanding = True
+                    self.save_counts(backtracks, backjumps, prunings, max_depth)
+                    return None  # paused before expanding the next node
+                nodes += 1
+                self.counter += 1
+                if not unassigned_positions:
+                    self.expanding = False
+                    self.save_counts(backtracks, backjumps, prunings, max_depth)
+                    return state
+
+                variable = select_variable(unassigned_positions, domains)
+                self.unlink(variable)
+                if update_degrees is not None:
+                    update_degrees(variable, -1)
+                frame = [variable, order_values(variable, domains), 0, self.trail_top, 0]
+                depth_of[variable] = len(stack)
+                stack.append(frame)
+                if len(stack) > max_depth:
+                    max_depth = len(stack)
+                if on_node is not None:
+                    on_node(self, variable, len(stack))
+                expanding = False
+            elif stack:
+                frame = stack[-1]
+            else:
+                self.expanding = False
+                self.save_counts(backtracks, backjumps, prunings, max_depth)
+                return []  # failure
+
+            variable, values, index, mark, conflicts = frame
+            while index < len(values):
+                value = values[index]
+                index += 1
+                if self.is_value_consistent(value, variable, state):
+                    state[variable] = value  # assignment
+                    self.prune(domains, variable, value_bit[value])
+
+                    # `inferences` are reduced domains of variables
+                    inferences = infer(domains, variable, value)
+                    if inferences:  # not failure
+                        # human-style propagation, when stages are switched on. If neither the
+                        # assignment nor FC changed a domain, the parent's fixpoint holds.
+                        if propagate is None or self.trail_top == mark or propagate(domains):
+                            prunings += self.trail_top - mark
+                            expanding = True  # descend into the child node
+                            break
+                    prunings += self.trail_top - mark
+                    if explain_failures:
+                        wiped = self.find_wipeout(variable, domains)
+                        if wiped >= 0:
+                            if backjumping:
+                                frame[4] |= self.get_conflicts(wiped, len(stack) - 1)
+                            if constraint_weighting:
+                                self.bump_weight(variable, wiped)
+                    # restoring inferences and the assignment itself
+                    self.restore_domains(domains, mark)
+                state[variable] = 0
+            frame[2] = index
+            if expanding:
+                continue
+
+            # every value failed: undo this frame and the parent's current assignment, or with
+            # backjumping every frame above the deepest one in conflict and that one's assignment
+            backtracks += 1
+            if backjumping:
+                depth = len(stack) - 1
+                conflicts = frame[4] | self.get_conflicts(variable, depth)
+                target = conflicts.bit_length() - 1  # -1 when no assignment is to blame: no solution
+                if target < depth - 1:
+                    backjumps += 1
+                self.unwind(target + 1)
+            else:
+                # self.unwind(len(stack) - 1) written out; every value of the frame is already undone
+                stack.pop()
+                unassigned_positions.add(variable)
+                self.link(variable, popcount[domains[variable]])
+                if update_degrees is not None:
+                    update_degrees(variable, 1)
+            if stack:
+                parent = stack[-1]
+                if backjumping:
+                    parent[4] |= conflicts & ~(1 << target)
+                self.restore_domains(domains, parent[3])
+                state[parent[0]] = 0
+
+    # the peer of `cell` whose domain is empty, or -1; forward checking stops at the first one
+    def find_wipeout(self, cell, domains):
+        for neighbour in self.adjacency_dict[cell]:
+            if not domains[neighbour]:
+                return neighbour
+        return -1
+
+    # Bitmask of the depths below `depth` whose assignments together rule out every value of the
+    # root domain of `cell`: for each value, the shallowest assigned peer that holds it.
+    def get_conflicts(self, cell, depth):
+        state = self.state
+        depth_of = self.depth_of
+        value_bit = self.value_bit
+        root_domain = self.root_domains[cell]
+        shallowest = {}
+        for neighbour in self.adjacency_dict[cell]:
+            value = state[neighbour]
+            if value and value_bit[value] & root_domain and depth_of[neighbour] >= 0:
+                if depth_of[neighbour] < shallowest.get(value, depth):
+                    shallowest[value] = depth_of[neighbour]
+        conflicts = 0
+        for neighbour_depth in shallowest.values():
+            conflicts |= 1 << neighbour_depth
+        return conflicts
+
+    # pops search frames until `depth` are left, undoing their assignments and everything below them
+    def unwind(self, depth):
+        stack = self.stack
+        domains = self.domains
+        update_degrees = self.get_degree_update()
+        while len(stack) > depth:
+            frame = stack.pop()
+            variable = frame[0]
+            self.restore_domains(domains, frame[3])
+            self.state[variable] = 0
+            self.unassigned_positions.add(variable)
+            self.link(variable, self.popcount[domains[variable]])
+            if update_degrees is not None:
+                update_degrees(variable, 1)
+
+    # the DEGREE_UPDATES method of the variable ordering, or None when it reads no degrees
+    def get_degree_update(self):
+        name = DEGREE_UPDATES.get(self.variable_ordering)
+        return None if name is None else getattr(self, name)
+
+    def save_counts(self, backtracks, backjumps, prunings, max_depth):
+        self.stats.update({"backtracks": backtracks, "backjumps": backjumps, "prunings": prunings,
+                           "max_depth": max_depth})
+
+    # pushes the current domain of `cell` onto the trail, then replaces it with `mask`
+    def prune(self, domains, cell, mask):
+        if domains[cell] == mask:
+            return  # nothing changes, so nothing to undo
+        top = self.trail_top
+        self.trail_cells[top] = cell
+        self.trail_domains[top] = domains[cell]
+        self.trail_top = top + 1
+        if self.track_supports:
+            self.update_supports(cell, domains[cell] & ~mask, -1)
+        domains[cell] = mask
+        if self.bucket_of[cell] >= 0:
+            self.move(cell, self.popcount[mask])
+
+    # pops the trail back to `mark`, restoring every domain changed since then
+    def restore_domains(self, domains, mark):
+        trail_cells = self.trail_cells
+        trail_domains = self.trail_domains
+        bucket_of = self.bucket_of
+        track_supports = self.track_supports
+        supports = self.supports
+        cell_support_offsets = self.cell_support_offsets
+        mask_values = self.mask_values
+        popcount = self.popcount
+        top = self.trail_top
+        while top > mark:
+            top -= 1
+            cell = trail_cells[top]
+            domain = trail_domains[top]
+            if track_supports:
+                (row, col, box) = cell_support_offsets[cell]
+                for value in mask_values[domain & ~domains[cell]]:
+                    supports[row + value] += 1
+                    supports[col + value] += 1
+                    supports[box + value] += 1
+            domains[cell] = domain
+            if bucket_of[cell] >= 0:
+                self.move(cell, popcount[domain])
+        self.trail_top = mark
+
+    # adds `delta` to the (unit, value) supports of `cell` for every value in `mask`
+    def update_supports(self, cell, mask, delta):
+        supports = self.supports
+        (row, col, box) = self.cell_support_offsets[cell]
+        for value in self.mask_values[mask]:
+            supports[row + value] += delta
+            supports[col + value] += delta
+            supports[box + value] += delta
+
+    # Runs the switched-on propagation stages until none of them prunes anything.
+    # After any pruning the pipeline restarts from the first (cheapest) stage.
+    # Returns False when a domain is wiped out or a value has no place left in a unit.
+    def propagate(self, domains):
+        stages = self.propagation_stages
+        stats = self.stats
+        while stages:
+            for stage in stages:
+                stats["propagation_rounds"] += 1
+                changed = stage(domains)
+                if changed is None:
+                    return False  # contradiction
+                if changed:
+                    break
+            else:
+                return True  # fixpoint
+        return True
+
+    # removes the bits in `mask` from `cell`; returns None on a wipe-out, else True
+    def eliminate(self, domains, cell, mask):
+        domain = domains[cell] & ~mask
+        self.prune(domains, cell, domain)
+        return True if domain else None
+
+    # an unassigned cell with a single value left removes that value from its peers
+    def naked_singles(self, domains):
+        changed = False
+        bucket_next = self.bucket_next
+        cell = self.bucket_heads[1]
+        while cell >= 0:
+            following = bucket_next[cell]  # pruning peers never moves `cell` itself
+            bit = domains[cell]
+            for neighbour in self.adjacency_dict[cell]:
+                if domains[neighbour] & bit:
+                    if self.eliminate(domains, neighbour, bit) is None:
+                        return None
+                    changed = True
+            cell = following
+        return changed
+
+    # a value with a single place left in a unit goes there
+    def hidden_singles(self, domains):
+        changed = False
+        supports = self.supports
+        grid = self.grid
+        for unit_index in range(len(grid.units)):
+            offset = unit_index * grid.support_stride
+            for value in grid.values:
+                support = supports[offset + value]
+                if support == 0:
+                    return None  # no cell of the unit can take `value`
+                if support == 1:
+                    bit = self.value_bit[value]
+                    for cell in grid.units[unit_index]:
+                        if domains[cell] & bit:
+                            if domains[cell] != bit:
+                                self.prune(domains, cell, bit)
+                                changed = True
+                            break
+        return changed
+
+    # two cells of a unit with the same two values remove them from the rest of the unit
+    def naked_pairs(self, domains):
+        changed = False
+        popcount = self.popcount
+        for unit in self.grid.units:
+            pairs = {}
+            for cell in unit:
+                domain = domains[cell]
+                if popcount[domain] == 2:
+                    if domain not in pairs:
+                        pairs[domain] = cell
+                        continue
+                    pair = (pairs[domain], cell)
+                    for other in unit:
+                        if other not in pair and domains[other] & domain:
+                            if self.eliminate(domains, other, domain) is None:
+                                return None
+                            changed = True
+        return changed
+
+    # two values confined to the same two cells of a unit remove every other value from them
+    def hidden_pairs(self, domains):
+        changed = False
+        supports = self.supports
+        grid = self.grid
+        for unit_index in range(len(grid.units)):
+            offset = unit_index * grid.support_stride
+            unit = grid.units[unit_index]
+            places = {}
+            for value in grid.values:
+                if supports[offset + value] == 2:
+                    bit = self.value_bit[value]
+                    pair = tuple(cell for cell in unit if domains[cell] & bit)
+                    places[pair] = places.get(pair, 0) | bit
+            for pair, mask in places.items():
+                if self.popcount[mask] == 2:
+                    for cell in pair:
+                        if domains[cell] & ~mask:
+                            self.prune(domains, cell, domains[cell] & mask)
+                            changed = True
+        return changed
+
+    # Pointing: a value confined to one row or column inside a box is removed from the rest of
+    # that line. Box-line reduction: a value confined to one box inside a line is removed from
+    # the rest of that box.
+    def pointing(self, domains):
+        changed = False
+        supports = self.supports
+        grid = self.grid
+        (row_of, col_of, box_of) = (grid.row_of, grid.col_of, grid.box_of)
+        for unit_index in range(len(grid.units)):
+            offset = unit_index * grid.support_stride
+            unit = grid.units[unit_index]
+            is_box = unit_index >= 2 * grid.side
+            for value in grid.values:
+                if supports[offset + value] < 2:
+                    continue  # a single place is a hidden single
+                bit = self.value_bit[value]
+                places = [cell for cell in unit if domains[cell] & bit]
+                (row, col, box) = (row_of[places[0]], col_of[places[0]], box_of[places[0]])
+                if is_box and all(row_of[cell] == row for cell in places):
+                    target = grid.row_units[row]
+                elif is_box and all(col_of[cell] == col for cell in places):
+                    target = grid.col_units[col]
+                elif not is_box and all(box_of[cell] == box for cell in places):
+                    target = grid.box_units[box]
+                else:
+                    continue
+                for cell in target:
+                    if domains[cell] & bit and cell not in places:
+                        if self.eliminate(domains, cell, bit) is None:
+                            return None
+                        changed = True
+        return changed
+
+    # files an unassigned cell at the head of the bucket for domain size `size`
+    def link(self, cell, size):
+        head = self.bucket_heads[size]
+        self.bucket_next[cell] = head
+        self.bucket_prev[cell] = -1
+        if head >= 0:
+            self.bucket_prev[head] = cell
+        self.bucket_heads[size] = cell
+        self.bucket_of[cell] = size
+
+    def unlink(self, cell):
+        prev = self.bucket_prev[cell]
+        next = self.bucket_next[cell]
+        if prev >= 0:
+            self.bucket_next[prev] = next
+        else:
+            self.bucket_heads[self.bucket_of[cell]] = next
+        if next >= 0:
+            self.bucket_prev[next] = prev
+        self.bucket_of[cell] = -1
+
+    # unlink followed by link, written out since forward checking calls it on every pruning
+    def move(self, cell, size):
+        bucket_heads = self.bucket_heads
+        bucket_next = self.bucket_next
+        bucket_prev = self.bucket_prev
+        prev = bucket_prev[cell]
+        next = bucket_next[cell]
+        if prev >= 0:
+            bucket_next[prev] = next
+        else:
+            bucket_heads[self.bucket_of[cell]] = next
+        if next >= 0:
+            bucket_prev[next] = prev
+        head = bucket_heads[size]
+        bucket_next[cell] = head
+        bucket_prev[cell] = -1
+        if head >= 0:
+            bucket_prev[head] = cell
+        bucket_heads[size] = cell
+        self.bucket_of[cell] = size
+
+    # adds `delta` to the degree of every peer when `cell` is assigned (-1) or unassigned (+1)
+    def update_degrees(self, cell, delta):
+        degrees = self.degrees
+        for neighbour in self.adjacency_dict[cell]:
+            degrees[neighbour] += delta
+
+    # adds the weights of the constraints of `cell` to (+1) or takes them from (-1) the weighted
+    # degree of every peer when `cell` is unassigned or assigned
+    def update_weighted_degrees(self, cell, sign):
+        weighted_degrees = self.weighted_degrees
+        for neighbour, weight in zip(self.adjacency_dict[cell], self.weights[cell]):
+            weighted_degrees[neighbour] += sign * weight
+
+    # Assigning `cell` wiped out the domain of its peer `neighbour`: the constraint between
+    # them gets heavier. Only the weighted degree of `cell` changes now; `neighbour` is
+    # unassigned, and its weighted degree gets the new weight once `cell` is unassigned.
+    def bump_weight(self, cell, neighbour):
+        peers = self.adjacency_dict
+        self.weights[cell][peers[cell].index(neighbour)] += 1
+        self.weights[neighbour][peers[neighbour].index(cell)] += 1
+        self.weighted_degrees[cell] += 1
+
+    # returns the unassigned cell that comes first in row-major order
+    def first_unassigned_variable(self, unassigned_positions, domains):
+        result = min(unassigned_positions)
+        unassigned_positions.remove(result)
+        return result
+
+    # returns the unassigned cell
     # that has the fewest allowable values in its domain
     def most_constrained_variable(self,  unassigned_positions, domains):
-        # initialise
-        smallest_domain_size = 10
-        result = ()
+        # the first non-empty bucket holds the smallest domains; no scan over unassigned cells
+        bucket_heads = self.bucket_heads
+        smallest_domain_size = 1
+        while bucket_heads[smallest_domain_size] < 0:
+            smallest_domain_size += 1
+        result = bucket_heads[smallest_domain_size]
 
-        for unassigned_position in unassigned_positions:
-            domain_length = len(domains[unassigned_position])
-            if domain_length < smallest_domain_size:
-                result = unassigned_position
-                smallest_domain_size = domain_length
-            # elif domain_length == smallest_domain_size:
-            #     result = self.compare_degree(unassigned_position, result, unassigned_positions)
+        if self.degree_tie_break:
+            # ties go to the cell with the most unassigned peers, read from the maintained degrees
+            degrees = self.degrees
+            bucket_next = self.bucket_next
+            candidate = bucket_next[result]
+            while candidate >= 0:
+                if degrees[candidate] > degrees[result]:
+                    result = candidate
+                candidate = bucket_next[candidate]
+
+        if self.rng is not None:
+            # any cell of the bucket (with the same degree, for degree_tie_break) is as good
+            degrees = self.degrees
+            bucket_next = self.bucket_next
+            ties = []
+            candidate = bucket_heads[smallest_domain_size]
+            while candidate >= 0:
+                if not self.degree_tie_break or degrees[candidate] == degrees[result]:
+                    ties.append(candidate)
+                candidate = bucket_next[candidate]
+            result = self.rng.choice(ties)
+
+        unassigned_positions.remove(result)
+        return result
+
+    # dom/wdeg: returns the unassigned cell with the smallest ratio of domain size to weighted
+    # degree, the lowest cell on ties. A cell without unassigned peers counts weighted degree 1.
+    def weighted_degree_variable(self, unassigned_positions, domains):
+        popcount = self.popcount
+        weighted_degrees = self.weighted_degrees
+        result = -1
+        (best_size, best_weight) = (1, 0)  # an infinite ratio
+        for cell in unassigned_positions:
+            size = popcount[domains[cell]]
+            weight = weighted_degrees[cell] or 1
+            # size / weight < best_size / best_weight without dividing
+            if size * best_weight < best_size * weight or (
+                    size * best_weight == best_size * weight and cell < result):
+                result = cell
+                (best_size, best_weight) = (size, weight)
 
         unassigned_positions.remove(result)
         return result
@@ -132,12 +1032,12 @@ class Sudoku(object):
         else:
             return x
 
-    # Pops the unassigned position (row, col) that has the highest degree.
+    # Pops the unassigned cell that has the highest degree.
     # Intuitively, such a tile has the most empty tiles in its row, column, and small square.
     def most_constraining_variable(self, unassigned_positions):
         # initialise
         max_degree = -1
-        result = ()
+        result = None
 
         for unassigned_position in unassigned_positions:
             current_degree = self.get_degree(unassigned_position, unassigned_positions)
@@ -158,104 +1058,115 @@ class Sudoku(object):
 
     def identity_domain(self, variable, domains):
         # return its domain
-        return domains[variable]
+        return self.mask_values[domains[variable]]
 
     def least_constraining_value(self, variable, domains):
         neighbours = self.adjacency_dict[variable]  # rows, columns, and small square
+        value_bit = self.value_bit
         value_count_tuples = []
 
-        for value in domains[variable]:
+        for value in self.mask_values[domains[variable]]:
+            bit = value_bit[value]
             count = 0
             for neighbour in neighbours:
-                if value in domains[neighbour]:
+                if domains[neighbour] & bit:
                     count += 1
             value_count_tuples.append((value, count))
 
+        if self.rng is not None:
+            self.rng.shuffle(value_count_tuples)  # the sort is stable, so this orders ties at random
         sorted_by_count = sorted(value_count_tuples, key=lambda tup: tup[1])
         result = [value[0] for value in sorted_by_count]
         return result
 
-    # Returns adjacency dictionary of cells (tuple) with its neighbours (array)
-    def get_adjacency_dict(self, state):
-        adjacency_dict = defaultdict(list)
-
-        for row in range(9):
-            for col in range(9):
-                position = (row, col)
-                adjacency_dict[position] = self.get_neighbours(position)
-
-        return adjacency_dict
-
-    # returns a list of the variable's neighbours (assigned or not).
-    def get_neighbours(self, variable):
-        neighbours = []
-        (row, col) = variable
-
-        for i in range(0, 9):
-            if i != row:
-                neighbours.append((i, col))
-            if i != col:
-                neighbours.append((row, i))
-
-        start_row = (row // 3) * 3
-        start_col = (col // 3) * 3
-        for current_row in range(start_row, start_row + 3):
-            for current_col in range(start_col, start_col + 3):
-                if current_col == col or current_row == row:
-                    continue  # exclude same row and col
-                else:
-                    neighbours.append((current_row, current_col))
-
-        return neighbours
-
     def count_valid_values(self, neighbour_domain, value):
-        count = 0
-        for val in neighbour_domain:
-            if val != value:
-                count += 1
-        return count
+        return self.popcount[neighbour_domain & ~self.value_bit[value]]
 
     # checks whether a variable-value assignment is consistent with the current state
-    # position is a tuple (row, col)
+    # position is a cell index
     def is_value_consistent(self, value, position, state):
-        neighbours = self.adjacency_dict[position]
-        result = True
+        for neighbour in self.adjacency_dict[position]:
+            if state[neighbour] == value:
+                return False
+        return True
 
-        for neighbour in neighbours:
-            (row, col) = neighbour
-            if state[row][col] == value:
-                result = False
+    # The inferences below have the signature of forward_checking(domains, position, value)
+    # so that backtrack can call any entry of INFERENCES.
+    def no_inference(self, domains, position, value):
+        return domains  # is_value_consistent alone keeps the assignment valid
 
-        return result
+    def singleton_inference(self, domains, position, value):
+        return self.forward_checking_singleton(self.make_arc_deque([position], self.unassigned_positions), domains)
 
-    def mac(self, deque, domains, removed=defaultdict(set)):
-        while deque:  # true if not empty
-            (X, Y) = deque.popleft()
+    def arc_consistency_inference(self, domains, position, value):
+        return self.mac(domains, [position])
 
-            if self.revise(domains, X, Y, removed):
-                # add removed
-                if len(domains[X]) == 0:
-                    return []
-                neighbours = self.adjacency_dict[X]
-                for Z in neighbours:
-                    if neighbours != Y: deque.append((Z, X))
+    # Maintaining Arc Consistency (AC-3) over the x != y arcs between peers, starting from
+    # `cells` whose domains just became singletons. As in AC-2001, a value x of X stays while
+    # it has a support in domains[Y]; for x != y any other value of Y supports it, so revising
+    # arc (X, Y) can only remove x when domains[Y] == {x}, a single bit test instead of a scan
+    # over value pairs. The queue therefore holds cells rather than arcs: a cell is queued
+    # when its domain shrinks to one value and at most once at a time, and popping it revises
+    # all arcs (peer, cell) at once. The order in which queued cells are taken does not change
+    # the fixpoint, so the queue is a plain list used as a stack.
+    # Returns domains, or [] on a wipe-out.
+    def mac(self, domains, cells):
+        adjacency_dict = self.adjacency_dict
+        lowest_value = self.grid.lowest_value
+        trail_cells = self.trail_cells
+        trail_domains = self.trail_domains
+        bucket_of = self.bucket_of
+        track_supports = self.track_supports
+        supports = self.supports
+        cell_support_offsets = self.cell_support_offsets
+        popcount = self.popcount
+        top = self.trail_top
+        queue = list(cells)
+        queued = set(cells)
+        while queue:  # true if not empty
+            Y = queue.pop()
+            queued.discard(Y)
+            bit = domains[Y]
+            value = lowest_value[bit]
+            for X in adjacency_dict[Y]:
+                domain = domains[X]
+                if domain & bit:
+                    # inlined self.prune, as in forward_checking
+                    trail_cells[top] = X
+                    trail_domains[top] = domain
+                    top += 1
+                    if track_supports:
+                        (row, col, box) = cell_support_offsets[X]
+                        supports[row + value] -= 1
+                        supports[col + value] -= 1
+                        supports[box + value] -= 1
+                    domain &= ~bit
+                    domains[X] = domain
+                    if bucket_of[X] >= 0:
+                        self.move(X, popcount[domain])
+                    # domain wipe-out
+                    if not domain:
+                        self.trail_top = top
+                        return []
+                    if popcount[domain] == 1 and X not in queued:
+                        queued.add(X)
+                        queue.append(X)
+        self.trail_top = top
         return domains
 
-    def forward_checking_singleton(self, deque, domains, removed=defaultdict(set)):
+    def forward_checking_singleton(self, deque, domains):
         while deque:  # true if not empty
             (X, Y) = deque.popleft()
-            y = next(iter(domains[Y]))  # Y is an assigned variable in MAC, thus it has only one value.
-            if y in domains[X]:
-                domains[X].remove(y)
-                removed[X].add(y)
-                # add removed
-                if len(domains[X]) == 0:
+            y = domains[Y]  # Y is an assigned variable in MAC, thus its mask has a single bit.
+            if domains[X] & y:
+                self.prune(domains, X, domains[X] & ~y)
+                # domain wipe-out
+                if domains[X] == 0:
                     return []
-                elif len(domains[X]) > 1:
+                elif self.popcount[domains[X]] > 1:
                     continue
-                neighbours = self.adjacency_dict[X]
-                for Z in neighbours:
-                    if neighbours != Y: deque.append((Z, X))
+                for Z in self.adjacency_dict[X]:
+                    if Z != Y: deque.append((Z, X))
         return domains
 
     # Maintaining Arc Consistency
@@ -269,36 +1180,42 @@ class Sudoku(object):
                     deque.append((neighbour, position))
         return deque
 
-    # revises domain of X; domain is mutated.
-    def revise(self, domains, X, Y, removed):
-        revised = False
-        for x in set(domains[X]):  # copy domains to prevent set changed size during iteration
-            is_satisfied = reduce(lambda prev, y: prev or x != y, domains[Y], False)
-            if not is_satisfied:
-                removed[X].add(x)
-                domains[X].remove(x)
-                revised = True
-        return revised
-
-    def forward_checking(self, domains, position, value, removed):
+    def forward_checking(self, domains, position, value):
         neighbours = self.adjacency_dict[position]
+        bit = self.value_bit[value]
+        trail_cells = self.trail_cells
+        trail_domains = self.trail_domains
+        bucket_of = self.bucket_of
+        track_supports = self.track_supports
+        supports = self.supports
+        cell_support_offsets = self.cell_support_offsets
+        popcount = self.popcount
+        top = self.trail_top
         for neighbour in neighbours:
-            if value in domains[neighbour]:
-                domains[neighbour].remove(value)
-                removed[neighbour].add(value)
-                if not domains[neighbour]:
+            domain = domains[neighbour]
+            if domain & bit:
+                # inlined self.prune: this is the hottest loop of the search
+                trail_cells[top] = neighbour
+                trail_domains[top] = domain
+                top += 1
+                if track_supports:
+                    (row, col, box) = cell_support_offsets[neighbour]
+                    supports[row + value] -= 1
+                    supports[col + value] -= 1
+                    supports[box + value] -= 1
+                domain &= ~bit
+                domains[neighbour] = domain
+                if bucket_of[neighbour] >= 0:
+                    self.move(neighbour, popcount[domain])
+                if not domain:
+                    self.trail_top = top
                     return []
 
+        self.trail_top = top
         return domains
 
     def get_unassigned_positions(self, state):
-        unassigned_positions = set()
-        for row in range(9):
-            for col in range(9):
-                unassigned_position = (row, col)
-                if state[row][col] == 0:
-                    unassigned_positions.add(unassigned_position)
-        return unassigned_positions
+        return set(cell for cell in self.grid.cells if state[cell] == 0)
 
     # you may add more classes/functions if you think is useful
     # However, ensure all the classes/functions are in this file ONLY
@@ -306,6 +1223,149 @@ class Sudoku(object):
     # Any other methods that you write should be used within the solve() method.
 
 
+# Algorithm X over array-backed dancing links, behind the same solve() interface as the CSP
+# engine: Sudoku(puzzle, engine="dlx"). Nodes are indices into the lists copied from
+# Grid.get_dancing_links rather than objects.
+class DancingLinks(object):
+
+    def __init__(self, state, grid=STANDARD_GRID):
+        (left, right, up, down, column, size) = grid.get_dancing_links()
+        self.grid = grid
+        self.left = left[:]
+        self.right = right[:]
+        self.up = up[:]
+        self.down = down[:]
+        self.column = column
+        self.size = size[:]
+        self.state = state
+        self.counter = 0
+        # same keys as Sudoku.stats; prunings, propagation rounds and ac time stay 0
+        self.stats = new_stats()
+
+    def cover(self, header):
+        left, right, up, down, column, size = self.left, self.right, self.up, self.down, self.column, self.size
+        right[left[header]] = right[header]
+        left[right[header]] = left[header]
+        row = down[header]
+        while row != header:
+            node = right[row]
+            while node != row:
+                down[up[node]] = down[node]
+                up[down[node]] = up[node]
+                size[column[node]] -= 1
+                node = right[node]
+            row = down[row]
+
+    def uncover(self, header):
+        left, right, up, down, column, size = self.left, self.right, self.up, self.down, self.column, self.size
+        row = up[header]
+        while row != header:
+            node = left[row]
+            while node != row:
+                size[column[node]] += 1
+                down[up[node]] = node
+                up[down[node]] = node
+                node = left[node]
+            row = up[row]
+        right[left[header]] = header
+        left[right[header]] = header
+
+    # covers the columns of every given; returns False if two givens claim the same column
+    def place_givens(self):
+        covered = set()
+        for cell in self.grid.cells:
+            value = self.state[cell]
+            if value:
+                for constraint in self.grid.get_exact_cover_columns(cell, value):
+                    if constraint in covered:
+                        return False
+                    covered.add(constraint)
+                    self.cover(1 + constraint)
+        return True
+
+    # returns the first solution as a flat state, or [] on failure
+    def search(self):
+        for state in self.solutions():
+            return state
+        return []
+
+    # Yields every solution as a new flat state; the search resumes when the next one is
+    # asked for. Time spent by the caller between solutions is not counted in `stats`.
+    def solutions(self):
+        start = time.time()
+        placed = self.place_givens()
+        resumed = time.time()
+        self.stats["preprocess_seconds"] = resumed - start
+        if not placed:
+            return
+        for state in self.exact_cover_search():
+            self.stats["search_seconds"] += time.time() - resumed
+            self.stats["nodes"] = self.counter
+            yield state
+            resumed = time.time()
+        self.stats["search_seconds"] += time.time() - resumed
+        self.stats["nodes"] = self.counter
+
+    # The search keeps the chosen rows on an explicit stack, like Sudoku.backtrack, and always
+    # branches on the smallest column. After a solution it carries on as if the last row failed.
+    def exact_cover_search(self):
+        right, down, column, size = self.right, self.down, self.column, self.size
+        stats = self.stats
+        # first row node; every row node maps back to its exact-cover row with (node - row_base) // 4
+        row_base = 1 + 4 * self.grid.cell_count
+        stack = []
+
+        while True:
+            self.counter += 1
+            if right[0] == 0:  # every column covered
+                state = self.state[:]
+                for node in stack:
+                    (cell, value) = divmod((node - row_base) // 4, self.grid.side)
+                    state[cell] = value + 1
+                yield state
+                if not stack:
+                    return  # the givens alone were the solution
+                # take back the last row and go on with the next row of its column
+                row = stack.pop()
+                header = column[row]
+                node = self.left[row]
+                while node != row:
+                    self.uncover(column[node])
+                    node = self.left[node]
+                row = down[row]
+            else:
+                header = right[0]
+                smallest = right[header]
+                while smallest != 0 and size[header] > 0:
+                    if size[smallest] < size[header]:
+                        header = smallest
+                    smallest = right[smallest]
+                self.cover(header)
+                row = down[header]
+
+            # find the next row to try, unwinding exhausted columns
+            while row == header:
+                self.uncover(header)
+                if not stack:
+                    return
+                stats["backtracks"] += 1
+                row = stack.pop()
+                header = column[row]
+                node = self.left[row]
+                while node != row:
+                    self.uncover(column[node])
+                    node = self.left[node]
+                row = down[row]
+
+            stack.append(row)
+            if len(stack) > stats["max_depth"]:
+                stats["max_depth"] = len(stack)
+            node = right[row]
+            while node != row:
+                self.cover(column[node])
+                node = right[node]
+
+
 if __name__ == "__main__":
     # STRICTLY do NOT modify the code in the main function here
     if len(sys.argv) != 3:
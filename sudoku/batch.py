@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+
+import argparse
+import collections
+import json
+import multiprocessing
+import sys
+import time
+
+from CS3243_P2_Sudoku_13 import (ENGINES, INFERENCES, PROPAGATION_STAGES, RESTART_SCHEDULES, VALUE_ORDERINGS,
+                                  VARIABLE_ORDERINGS, Sudoku, get_box_size, get_grid)
+from cache import SolutionCache
+from compact import PuzzleFile, to_grid
+
+"""
+HOW IT WORKS:
+    ./batch.py puzzles.txt solutions.txt --stats stats.jsonl
+Solves every puzzle in puzzles.txt inside one interpreter and writes one solution per line
+to solutions.txt (stdout when omitted, `-` reads puzzles from stdin). stats.jsonl gets one
+JSON object per puzzle: its index, solve time, nodes, backtracks, prunings, propagation
+rounds, max depth and the preprocess/ac/search phase timings, to find the slow puzzles of a
+batch or to compare two heuristics puzzle by puzzle. Puzzles are either
+81 characters on one line ('0' or '.' for blanks) or 9x9 grids in the format of input1.txt.
+Puzzles are read, solved and written one at a time, so memory use does not depend on
+the size of the corpus.
+    ./batch.py puzzles.txt solutions.txt --jobs 0
+Shards the puzzles across one worker process per core (or --jobs N workers). Solutions
+still come out in input order.
+    ./batch.py puzzles.txt solutions.txt --engine dlx --stats dlx.jsonl
+Solves with the DancingLinks exact-cover engine instead of the CSP search; compare the
+throughput line and the per-puzzle node counts against a run with --engine csp.
+    ./batch.py puzzles.txt solutions.txt --inference mac --variable-ordering mrv+degree --value-ordering identity
+Picks the search strategies of the csp engine: inference after every assignment (none, fc,
+fc-singleton, mac), variable ordering (first, mrv, mrv+degree, dom/wdeg) and value
+ordering (identity, lcv). Run the corpus once per combination to find the fastest one.
+    ./batch.py puzzles.txt solutions.txt --propagation naked_singles,hidden_singles
+Switches on propagation stages inside every search node (`all` for every stage).
+    ./batch.py puzzles.txt solutions.txt --backjumping --stats cbj.jsonl
+After a dead end the csp engine jumps straight back to the deepest assignment that caused it
+instead of the previous one; the backjumps stat counts the jumps that skipped a level.
+    ./batch.py puzzles16.txt solutions16.txt --box-size 4 --restarts luby --solver-seed 1
+Breaks mrv and lcv ties at random and starts a puzzle's search over after 1000, 1000, 2000,
+1000, 1000, 2000, 4000, ... nodes (--restart-base sets the 1000; --restarts geometric grows
+1000, 1000, 2000, 3000, 5000, ...), which cuts off the very long solves that one bad early
+branch causes. The same seed gives the same searches; --solver-seed alone only randomizes
+the ties. The stats count the restarts.
+    ./batch.py puzzles.txt counts.txt --count-solutions 2
+Writes the number of solutions of every puzzle instead of a solution, counting no further
+than 2: 1 means the puzzle is proper, 2 that it has several solutions, 0 that it has none.
+    ./batch.py puzzles.txt solutions.txt --cache 100000 --cache-file solutions.cache
+Answers a puzzle that is a relabeled, permuted or transposed copy of one of the last 100000
+solved from a cache instead of searching (see cache.py); the stats mark those as cached, and
+solutions.cache keeps the cache for the next run.
+    ./batch.py puzzles16.txt solutions16.txt --box-size 4
+Reads 16x16 puzzles (--box-size 5 for 25x25, ...). Larger grids need more than one digit
+per cell, so cells are whitespace-separated numbers, '0' or '.' for blanks, and solutions
+are written the same way.
+    ./batch.py puzzles.txt solutions.txt --mmap --jobs 0
+Reads a file of one-line 9x9 puzzles through a memory map and keeps every puzzle waiting to
+be solved as an 81-byte state (see compact.py).
+"""
+
+
+# yields each puzzle in `lines` as a side x side list of lists (side = box_size ** 2).
+# Cells are collected across lines, so one-line and grid puzzles can be mixed freely.
+# Lines starting with '#' are comments.
+def read_puzzles(lines, box_size=3):
+    side = box_size * box_size
+    cell_count = side * side
+    cells = []
+    for line in lines:
+        if line.startswith('#'):
+            continue
+        for value in read_cells(line, side):
+            cells.append(value)
+            if len(cells) == cell_count:
+                yield [cells[row * side:row * side + side] for row in range(side)]
+                cells = []
+    if cells:
+        raise ValueError("Incomplete puzzle at end of input ({0} cells)".format(len(cells)))
+
+
+# cell values on one line: single digits for 9x9 (so '530070000...' works),
+# whitespace-separated numbers for larger grids
+def read_cells(line, side):
+    if side < 10:
+        return [0 if char == '.' else int(char) for char in line if '0' <= char <= '9' or char == '.']
+    values = [0 if token == '.' else int(token) for token in line.split()]
+    for value in values:
+        if not 0 <= value <= side:
+            raise ValueError("Cell value {0} out of range for a {1}x{1} puzzle".format(value, side))
+    return values
+
+
+# one-line form of a grid: 81 digits for 9x9, space-separated numbers for larger grids
+def format_line(grid):
+    if len(grid) < 10:
+        return "".join(str(value) for row in grid for value in row)
+    return " ".join(str(value) for row in grid for value in row)
+
+
+# same layout that CS3243_P2_Sudoku_13.py writes to its output file
+def format_grid(grid):
+    return "".join(" ".join(str(value) for value in row) + " \n" for row in grid)
+
+
+# True if `ans` fills every unit with 1..side and keeps the givens of `puzzle`
+def is_solution(puzzle, ans):
+    grid = get_grid(get_box_size(len(ans)))
+    cells = [value for row in ans for value in row]
+    givens = [value for row in puzzle for value in row]
+    if any(given and given != value for given, value in zip(givens, cells)):
+        return False
+    return all(sorted(cells[cell] for cell in unit) == list(grid.values) for unit in grid.units)
+
+
+# solves a single puzzle without printing; returns (answer or None, stats).
+# `options` are extra keyword arguments for Sudoku, e.g. {"engine": "dlx"}.
+# With `count_limit` the answer is the number of solutions instead, counted up to that limit.
+# With a cache.SolutionCache, puzzles equivalent to an earlier one are answered from it.
+def solve_puzzle(puzzle, options=None, count_limit=None, cache=None):
+    start = time.time()
+    if isinstance(puzzle, bytearray):  # a compact state, as --mmap reads them
+        puzzle = to_grid(puzzle)
+    sudoku = Sudoku(puzzle, verbose=False, **(options or {}))
+    if count_limit is not None:
+        ans = sudoku.count_solutions(count_limit)
+    elif cache is not None:
+        hits = cache.hits
+        result = cache.solve(sudoku)
+    else:
+        result = sudoku.search()
+    end = time.time()
+
+    if count_limit is None:
+        ans = sudoku.unflatten(result) if result else None
+    # the solver's counters and phase timings plus the end-to-end time
+    stats = dict(sudoku.stats)
+    solved = ans > 0 if count_limit is not None else ans is not None
+    stats.update({"seconds": end - start, "solved": solved})
+    if cache is not None and count_limit is None:
+        stats["cached"] = cache.hits > hits
+    return ans, stats
+
+
+# yields (index, answer or None, stats) for every puzzle, in input order
+def solve_batch(puzzles, options=None, count_limit=None, cache=None):
+    for index, puzzle in enumerate(puzzles):
+        ans, stats = solve_puzzle(puzzle, options, count_limit, cache)
+        stats["index"] = index
+        yield index, ans, stats
+
+
+# groups an iterable into lists of `size` items; the last list may be shorter
+def chunked(items, size):
+    if size < 1:
+        raise ValueError("Chunk size must be at least 1, got {0}".format(size))
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# runs in a worker process. Workers live for the whole batch, so the solver module and
+# its peer tables are imported once per process rather than once per chunk.
+def solve_chunk(chunk, options=None, count_limit=None):
+    return [solve_puzzle(puzzle, options, count_limit) for puzzle in chunk]
+
+
+# same results as solve_batch, computed by a pool of `processes` workers (all cores when None).
+# Puzzles are sent in chunks of `chunk_size`.
+def solve_batch_parallel(puzzles, processes=None, chunk_size=64, options=None, count_limit=None):
+    results = map_chunks(solve_chunk, chunked(puzzles, chunk_size), (options, count_limit), processes)
+    for index, (ans, stats) in enumerate(results):
+        stats["index"] = index
+        yield index, ans, stats
+
+
+# Yields the items of function(chunk, *args) for every chunk, in input order, computed by a
+# pool of `processes` workers (all cores when None). At most 4 chunks per worker are in
+# flight, so `chunks` is consumed only as fast as results are taken and may be endless.
+def map_chunks(function, chunks, args=(), processes=None):
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(processes)
+    pending = collections.deque()
+    finished = False
+    try:
+        for chunk in chunks:
+            pending.append(pool.apply_async(function, (chunk,) + tuple(args)))
+            while len(pending) >= processes * 4 or (pending and pending[0].ready()):
+                for item in pending.popleft().get():
+                    yield item
+        while pending:
+            for item in pending.popleft().get():
+                yield item
+        finished = True
+    finally:
+        if finished:
+            pool.close()
+        else:
+            pool.terminate()  # consumer stopped early or a worker failed
+        pool.join()
+
+
+# writes solutions (and optionally JSON stats lines) as they are produced;
+# returns (number of puzzles, number solved)
+def write_results(results, output, stats_output=None, formatter=format_line):
+    count = 0
+    solved = 0
+    for index, ans, stats in results:
+        count += 1
+        if stats["solved"]:
+            solved += 1
+        if ans is None:
+            output.write("unsolvable\n")
+        else:
+            output.write(formatter(ans) + "\n")
+        if stats_output is not None:
+            stats_output.write(json.dumps(stats, sort_keys=True) + "\n")
+    return count, solved
+
+
+def open_input(path):
+    return sys.stdin if path == "-" else open(path, "r")
+
+
+def open_output(path):
+    return sys.stdout if path in (None, "-") else open(path, "w")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Solve a file of sudoku puzzles in one process.")
+    parser.add_argument("input", help="puzzle file, one 81-character line or 9x9 grid per puzzle; - for stdin")
+    parser.add_argument("--box-size", type=int, default=3,
+                        help="box size of the puzzles: 3 for 9x9 (default), 4 for 16x16, 5 for 25x25, ...")
+    parser.add_argument("output", nargs="?", help="solution file (default: stdout)")
+    parser.add_argument("--stats", help="write one JSON line of stats per puzzle to this file")
+    parser.add_argument("--grid", action="store_true", help="write solutions as 9x9 grids instead of lines")
+    parser.add_argument("--count-solutions", type=positive_int, metavar="LIMIT",
+                        help="write the number of solutions of each puzzle, counting up to LIMIT, instead of a solution")
+    parser.add_argument("-j", "--jobs", type=non_negative_int, default=1,
+                        help="worker processes; 0 uses every core, 1 (default) solves in this process")
+    parser.add_argument("--chunk-size", type=positive_int, default=64, help="puzzles sent to a worker at a time")
+    parser.add_argument("--cache", type=positive_int, metavar="SIZE",
+                        help="answer puzzles equivalent to one of the last SIZE solved from a cache (--jobs 1 only)")
+    parser.add_argument("--cache-file", help="load the cache from this file if it exists and save it back")
+    parser.add_argument("--mmap", action="store_true",
+                        help="memory-map the input, a file of one-line 9x9 puzzles, and keep puzzles as bytearrays")
+    add_solver_arguments(parser)
+    return parser.parse_args(argv)
+
+
+# argparse type of the options that count nodes or items and must be at least 1
+def positive_int(text):
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError("expected a positive integer, got {0}".format(value))
+    return value
+
+
+# argparse type of --jobs, where 0 means every core
+def non_negative_int(text):
+    value = int(text)
+    if value < 0:
+        raise argparse.ArgumentTypeError("expected a non-negative integer, got {0}".format(value))
+    return value
+
+
+# solver options shared with the other command line tools; read back with get_options
+def add_solver_arguments(parser):
+    parser.add_argument("--engine", choices=ENGINES, default="csp", help="solver engine (default: csp)")
+    parser.add_argument("--inference", choices=list(INFERENCES), default="fc",
+                        help="inference after every assignment of the csp engine (default: fc)")
+    parser.add_argument("--variable-ordering", choices=list(VARIABLE_ORDERINGS), default="mrv",
+                        help="how the csp engine picks the next cell (default: mrv)")
+    parser.add_argument("--value-ordering", choices=list(VALUE_ORDERINGS), default="lcv",
+                        help="order in which the csp engine tries values (default: lcv)")
+    parser.add_argument("--propagation", default="",
+                        help="comma-separated propagation stages, or `all`: " + ",".join(PROPAGATION_STAGES))
+    parser.add_argument("--backjumping", action="store_true",
+                        help="conflict-directed backjumping in the csp engine (needs --inference fc, no propagation)")
+    parser.add_argument("--restarts", choices=list(RESTART_SCHEDULES), default="none",
+                        help="restart schedule of the csp engine (default: none)")
+    parser.add_argument("--restart-base", type=positive_int, default=1000,
+                        help="node limit of a run where the restart schedule is 1 (default: 1000)")
+    parser.add_argument("--solver-seed", type=int,
+                        help="break mrv and lcv ties at random with this seed (restarts default to 0)")
+
+
+# Sudoku keyword arguments selected on the command line
+def get_options(args):
+    if args.propagation == "all":
+        propagation = PROPAGATION_STAGES
+    else:
+        propagation = tuple(stage for stage in args.propagation.split(",") if stage)
+    return {"engine": args.engine, "inference": args.inference, "variable_ordering": args.variable_ordering,
+            "value_ordering": args.value_ordering, "propagation": propagation, "backjumping": args.backjumping,
+            "seed": args.solver_seed, "restarts": args.restarts, "restart_base": args.restart_base}
+
+
+def main(argv):
+    args = parse_args(argv)
+    if args.mmap and (args.input == "-" or args.box_size != 3):
+        raise ValueError("--mmap needs a file of one-line 9x9 puzzles")
+    puzzles_file = PuzzleFile(args.input) if args.mmap else open_input(args.input)
+    output = open_output(args.output)
+    stats_output = open(args.stats, "w") if args.stats else None
+    formatter = format_grid if args.grid else format_line
+    if args.count_solutions is not None:
+        formatter = str
+    options = get_options(args)
+    cache = None
+    if args.cache is not None or args.cache_file:
+        if args.jobs != 1 or args.count_solutions is not None:
+            raise ValueError("--cache needs --jobs 1 and cannot count solutions")
+        cache = SolutionCache(10000 if args.cache is None else args.cache, args.cache_file)
+
+    puzzles = iter(puzzles_file) if args.mmap else read_puzzles(puzzles_file, args.box_size)
+    if args.jobs == 1:
+        results = solve_batch(puzzles, options, args.count_solutions, cache)
+    else:
+        results = solve_batch_parallel(puzzles, args.jobs or None, args.chunk_size, options, args.count_solutions)
+
+    start = time.time()
+    count, solved = write_results(results, output, stats_output, formatter)
+    end = time.time()
+    if cache is not None and cache.path:
+        cache.save()
+
+    for f in (puzzles_file, output, stats_output):
+        if f not in (None, sys.stdin, sys.stdout):
+            f.close()
+    elapsed = end - start
+    if cache is not None:
+        sys.stderr.write("Cache: {0} hits, {1} misses\n".format(cache.hits, cache.misses))
+    sys.stderr.write("Solved {0}/{1} puzzles in {2:.3f}s ({3:.1f} puzzles/s, {4} process(es))\n".format(
+        solved, count, elapsed, count / elapsed if elapsed > 0 else 0.0,
+        args.jobs or multiprocessing.cpu_count()))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
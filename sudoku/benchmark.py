@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+
+import argparse
+import glob
+import json
+import math
+import os
+import platform
+import re
+import sys
+import timeit
+
+from CS3243_P2_Sudoku_13 import Sudoku
+from batch import add_solver_arguments, get_options, is_solution, read_puzzles
+
+"""
+HOW IT WORKS:
+    ./benchmark.py
+Solves every public_tests_p2_sudoku/input{n}.txt inside this interpreter: one untimed warm-up
+solve, then 5 timed solves per puzzle. Prints the median and 95th percentile solve time and
+the node count of every puzzle, and exits with status 1 when an answer differs from
+public_tests_p2_sudoku/output{n}.txt. Unlike runner.py, interpreter start-up and file I/O
+are not part of the measurement.
+    ./benchmark.py --corpus puzzles.txt --repeat 20 --warmup 3 --inference mac
+Also measures every puzzle of a batch.py corpus (these have no expected output; answers are
+checked against the rules and the givens). Takes the same solver options as batch.py.
+    ./benchmark.py --save-baseline benchmark_baseline.json
+    ./benchmark.py --baseline benchmark_baseline.json
+Stores the medians and node counts of a run, or compares against a stored run and exits with
+status 1 when a puzzle needs more nodes or its median is more than --tolerance (default 50%;
+short solves time noisily, node counts are exact) plus --slack seconds slower.
+benchmark_baseline.json is the stored run for the default options under CPython 3.11 on
+x86_64; refresh it with --save-baseline when a change is meant to move the numbers. A
+baseline is only compared against runs with the same options, interpreter and machine type
+(python2 solves take about twice as long); benchmark_baseline_py2.json is the same run
+under CPython 2.7.
+"""
+
+TEST_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "public_tests_p2_sudoku")
+
+
+# yields (name, puzzle, expected answer or None) for the public tests and every corpus puzzle
+def load_cases(test_directory, corpora, box_size=3):
+    inputs = glob.glob(os.path.join(test_directory, "input*.txt"))
+    for path in sorted(inputs, key=lambda path: int(re.sub(r"\D", "", os.path.basename(path)) or 0)):
+        with open(path) as f:
+            puzzle = next(read_puzzles(f))
+        expected = None
+        output_path = os.path.join(test_directory, os.path.basename(path).replace("input", "output"))
+        if os.path.isfile(output_path):
+            with open(output_path) as f:
+                expected = next(read_puzzles(f))
+        yield os.path.basename(path), puzzle, expected
+    for corpus in corpora:
+        with open(corpus) as f:
+            for index, puzzle in enumerate(read_puzzles(f, box_size)):
+                yield "{0}:{1}".format(os.path.basename(corpus), index), puzzle, None
+
+
+# solves `puzzle` `warmup` times untimed, then `repeat` times timed; returns (seconds list, nodes, answer)
+def measure(puzzle, options, warmup, repeat):
+    for _ in range(warmup):
+        Sudoku(puzzle, verbose=False, **options).search()
+    times = []
+    for _ in range(repeat):
+        sudoku = Sudoku(puzzle, verbose=False, **options)
+        start = timeit.default_timer()
+        result = sudoku.search()
+        times.append(timeit.default_timer() - start)
+    ans = sudoku.unflatten(result) if result else None
+    return times, sudoku.counter, ans
+
+
+# the interpreter and machine a run was timed on, as recorded in baseline files
+def get_environment():
+    return {"implementation": platform.python_implementation(),
+            "python": "{0}.{1}".format(*sys.version_info[:2]), "machine": platform.machine()}
+
+
+# nearest-rank percentile, `fraction` in (0, 1]
+def percentile(values, fraction):
+    ordered = sorted(values)
+    rank = int(math.ceil(round(fraction * len(ordered), 9)))  # round first: 0.95 * 20 is 19.000000000000004
+    return ordered[max(rank, 1) - 1]
+
+
+# returns a list of messages, one per puzzle that got slower or needs more nodes than `baseline`
+def find_regressions(results, baseline, tolerance, slack):
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        if result["nodes"] > base["nodes"]:
+            regressions.append("{0}: {1} nodes, baseline {2}".format(name, result["nodes"], base["nodes"]))
+        if result["median"] > base["median"] * (1 + tolerance) + slack:
+            regressions.append("{0}: median {1:.4f}s, baseline {2:.4f}s".format(
+                name, result["median"], base["median"]))
+    return regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the solver in-process on the public tests.")
+    parser.add_argument("--corpus", action="append", default=[], help="extra puzzle file (repeatable)")
+    parser.add_argument("--box-size", type=int, default=3, help="box size of the corpus puzzles (default: 3)")
+    parser.add_argument("--tests", default=TEST_DIRECTORY, help="directory with input{n}.txt and output{n}.txt")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed solves per puzzle (default: 1)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed solves per puzzle (default: 5)")
+    parser.add_argument("--baseline", help="fail on regressions against this baseline file")
+    parser.add_argument("--save-baseline", help="write this run to a baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="allowed relative slowdown of a median (default: 0.5)")
+    parser.add_argument("--slack", type=float, default=0.002,
+                        help="allowed absolute slowdown in seconds, for puzzles too fast to time (default: 0.002)")
+    add_solver_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    if args.repeat < 1:
+        raise ValueError("--repeat must be at least 1")
+    options = get_options(args)
+    # the options as they appear in a baseline file, so that runs with other options are not compared
+    recorded_options = json.loads(json.dumps(options, sort_keys=True))
+
+    results = {}
+    failures = []
+    print("{0:<24} {1:>10} {2:>10} {3:>8}  {4}".format("puzzle", "median s", "p95 s", "nodes", "check"))
+    for name, puzzle, expected in load_cases(args.tests, args.corpus, args.box_size):
+        times, nodes, ans = measure(puzzle, options, args.warmup, args.repeat)
+        if ans is None:
+            check = "UNSOLVED"
+        elif expected is not None:
+            check = "ok" if ans == expected else "WRONG"
+        else:
+            check = "ok" if is_solution(puzzle, ans) else "WRONG"
+        if check != "ok":
+            failures.append("{0}: {1}".format(name, check))
+        results[name] = {"median": percentile(times, 0.5), "p95": percentile(times, 0.95), "nodes": nodes}
+        print("{0:<24} {1:>10.4f} {2:>10.4f} {3:>8}  {4}".format(
+            name, results[name]["median"], results[name]["p95"], nodes, check))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["options"] != recorded_options:
+            raise ValueError("Baseline {0} was recorded with options {1}, not {2}".format(
+                args.baseline, baseline["options"], recorded_options))
+        if baseline.get("environment") != get_environment():
+            raise ValueError("Baseline {0} was recorded on {1}, not {2}".format(
+                args.baseline, baseline.get("environment"), get_environment()))
+        failures.extend(find_regressions(results, baseline["puzzles"], args.tolerance, args.slack))
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"environment": get_environment(), "options": recorded_options, "puzzles": results}, f,
+                      indent=2, separators=(",", ": "), sort_keys=True)  # no trailing spaces on python2
+            f.write("\n")
+
+    for failure in failures:
+        sys.stderr.write("FAIL " + failure + "\n")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
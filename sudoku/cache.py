@@ -0,0 +1,161 @@
+import collections
+import itertools
+import json
+import os
+
+from CS3243_P2_Sudoku_13 import get_box_size
+
+"""
+HOW IT WORKS:
+    ./batch.py puzzles.txt solutions.txt --cache 100000 --cache-file solutions.cache
+Answers a puzzle that is the same as an earlier one up to digit relabeling, row and column
+permutations within bands and stacks, band and stack swaps and transposition by mapping the
+earlier solution back instead of searching. Sudoku(puzzle, cache=SolutionCache()) does the
+same for solve(). The cache keeps the most recently used --cache puzzles and, with
+--cache-file, is loaded from and saved to that file so that it outlives the run.
+
+How a puzzle is canonicalized: rows are ordered by a key that no symmetry changes (its clue
+count, the clue counts of its stacks and the clue counts of the columns of its clues), within
+bands ordered by the sorted keys of their rows, and columns the same way; both orientations
+are tried. Rows, columns, bands or stacks with equal keys are tried in every order, up to
+MAX_ORDERINGS per axis. Digits are then renumbered in order of first appearance, and the
+smallest grid found is the canonical form. A puzzle with more ties than that may miss an
+equivalent cached one, but never gets a wrong answer: a hit always maps the solution of the
+very same canonical puzzle back.
+"""
+
+# Orderings of tied rows (or columns) tried per orientation; past it only the first ones count.
+MAX_ORDERINGS = 24
+
+
+def transpose(grid):
+    return [list(row) for row in zip(*grid)]
+
+
+# every order of `items` that sorts them by `key`, tied items permuted, at most MAX_ORDERINGS
+def get_tie_orders(items, key):
+    groups = [list(group) for _, group in itertools.groupby(sorted(items, key=key), key)]
+    orders = itertools.product(*[itertools.permutations(group) for group in groups])
+    return [[item for group in order for item in group] for order in itertools.islice(orders, MAX_ORDERINGS)]
+
+
+# candidate row orders of `grid` (rows stay within their bands), from invariant row and band keys
+def get_row_orders(grid, box_size):
+    side = len(grid)
+    col_counts = [sum(1 for row in grid if row[col]) for col in range(side)]
+    keys = []
+    for row in grid:
+        stack_counts = sorted(sum(1 for value in row[stack:stack + box_size] if value)
+                              for stack in range(0, side, box_size))
+        keys.append((side - row.count(0), tuple(stack_counts),
+                     tuple(sorted(col_counts[col] for col in range(side) if row[col]))))
+    band_keys = [tuple(sorted(keys[band * box_size:band * box_size + box_size])) for band in range(box_size)]
+    row_orders = [get_tie_orders(range(band * box_size, band * box_size + box_size), keys.__getitem__)
+                  for band in range(box_size)]
+    orders = []
+    for band_order in get_tie_orders(range(box_size), band_keys.__getitem__):
+        for rows in itertools.product(*[row_orders[band] for band in band_order]):
+            orders.append([row for band_rows in rows for row in band_rows])
+            if len(orders) == MAX_ORDERINGS:
+                return orders
+    return orders
+
+
+# the cells of `grid` read in the given row and column order with digits numbered by first
+# appearance; returns (cells, labels) with labels[digit] the new number of every digit
+def relabel(grid, row_order, col_order):
+    labels = {0: 0}
+    cells = []
+    for row in row_order:
+        values = grid[row]
+        for col in col_order:
+            value = values[col]
+            if value not in labels:
+                labels[value] = len(labels)
+            cells.append(labels[value])
+    for value in range(1, len(grid) + 1):  # digits without a clue, in increasing order
+        if value not in labels:
+            labels[value] = len(labels)
+    return tuple(cells), labels
+
+
+# Returns (key, transform) for a side x side puzzle: key is the canonical puzzle as a flat
+# tuple, transform = (transposed, row order, column order, labels) maps the puzzle onto it.
+def canonicalize(puzzle):
+    box_size = get_box_size(len(puzzle))
+    best = None
+    for transposed in (False, True):
+        grid = transpose(puzzle) if transposed else puzzle
+        row_orders = get_row_orders(grid, box_size)
+        col_orders = get_row_orders(transpose(grid), box_size)
+        for row_order, col_order in itertools.product(row_orders, col_orders):
+            (cells, labels) = relabel(grid, row_order, col_order)
+            if best is None or cells < best[0]:
+                best = (cells, (transposed, row_order, col_order, labels))
+    return best
+
+
+# the flat solution `state` of the puzzle, moved and renumbered like the puzzle by `transform`
+def to_canonical(state, transform):
+    (transposed, row_order, col_order, labels) = transform
+    side = len(row_order)
+    if transposed:
+        return [labels[state[col * side + row]] for row in row_order for col in col_order]
+    return [labels[state[row * side + col]] for row in row_order for col in col_order]
+
+
+# inverse of to_canonical: the flat solution of the original puzzle
+def from_canonical(cells, transform):
+    (transposed, row_order, col_order, labels) = transform
+    side = len(row_order)
+    digits = dict((label, value) for value, label in labels.items())
+    state = [0] * (side * side)
+    for index, value in enumerate(cells):
+        (row, col) = (row_order[index // side], col_order[index % side])
+        if transposed:
+            (row, col) = (col, row)
+        state[row * side + col] = digits[value]
+    return state
+
+
+# Least recently used map from canonical puzzle to canonical solution, at most `size` entries.
+class SolutionCache(object):
+    def __init__(self, size=10000, path=None):
+        if size < 1:
+            raise ValueError("Cache size must be at least 1, got {0}".format(size))
+        self.size = size
+        self.path = path
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if path is not None and os.path.isfile(path):
+            self.load(path)
+
+    # Solves `sudoku` (a Sudoku instance) from the cache, or with sudoku.search() and caches
+    # the solution; returns the solved flat state or [] on failure, like search().
+    def solve(self, sudoku):
+        (key, transform) = canonicalize(sudoku.puzzle)
+        cells = self.entries.pop(key, None)
+        if cells is not None:
+            self.entries[key] = cells  # now the most recently used
+            self.hits += 1
+            return from_canonical(cells, transform)
+        self.misses += 1
+        result = sudoku.search()
+        if result:
+            self.entries[key] = to_canonical(result, transform)
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return result
+
+    # entries are stored least recently used first, so a reload keeps the order
+    def save(self, path=None):
+        with open(path or self.path, "w") as f:
+            json.dump([[list(key), cells] for key, cells in self.entries.items()], f)
+
+    def load(self, path):
+        with open(path) as f:
+            for key, cells in json.load(f):
+                self.entries[tuple(key)] = cells
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
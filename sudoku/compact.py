@@ -0,0 +1,132 @@
+import mmap
+import os
+
+"""
+HOW IT WORKS:
+    ./batch.py puzzles.txt solutions.txt --mmap
+Reads a file of one-line 9x9 puzzles (81 characters, '0' or '.' for blanks, '#' comment
+lines) through a read-only memory map instead of line by line. Each puzzle stays a slice of
+the mapped file until it is decoded, with one translate call rather than a loop over its
+characters, into an 81-byte bytearray state, which is also what batch.py keeps in flight
+and sends to its workers. A state takes 140 bytes where the list-of-lists grid takes
+about 1.3 KB.
+
+In Python:
+    with PuzzleFile("puzzles.txt") as puzzles:
+        state = puzzles.state(12345)        # random access, nothing before it is read
+        sudoku = Sudoku(to_grid(state))
+The Sudoku search itself keeps working on lists: indexing a list of small ints is faster
+than indexing a bytearray, and the states convert with to_grid and from_grid.
+"""
+
+# character code -> cell value for the one-line format; 255 marks a character that is not a cell
+DECODE_TABLE = bytearray([255] * 256)
+for _digit in range(10):
+    DECODE_TABLE[ord("0") + _digit] = _digit
+DECODE_TABLE[ord(".")] = 0
+DECODE_TABLE = bytes(DECODE_TABLE)
+# cell value -> character code
+ENCODE_TABLE = bytes(bytearray([ord("0") + value if value < 10 else 255 for value in range(256)]))
+
+CELL_COUNT = 81
+SIDE = 9
+
+
+# the 81-byte state of a one-line puzzle (bytes, bytearray or memoryview, 81 characters)
+def parse_line(line):
+    state = bytearray(line).translate(DECODE_TABLE)
+    if len(state) != CELL_COUNT or 255 in state:
+        raise ValueError("Not a one-line 9x9 puzzle: {0!r}".format(bytes(line)))
+    return state
+
+
+# the one-line form of a state, as bytes
+def format_state(state):
+    return bytes(bytearray(state).translate(ENCODE_TABLE))
+
+
+# state -> list of lists for Sudoku
+def to_grid(state):
+    return [list(state[row * SIDE:row * SIDE + SIDE]) for row in range(SIDE)]
+
+
+# list of lists (or a flat list, such as Sudoku.state) -> state
+def from_grid(grid):
+    if grid and isinstance(grid[0], list):
+        return bytearray(value for row in grid for value in row)
+    return bytearray(grid)
+
+
+# A file of one-line 9x9 puzzles, memory-mapped read-only. puzzles[i] is puzzle i as a
+# memoryview of the mapped characters (no copy); puzzles.state(i) decodes it. Only the line
+# offsets are kept in memory, found once by scanning the map for newlines. Slices must not
+# be used after close(), and indexing a closed file raises ValueError; decode the slices
+# to keep with parse_line first.
+class PuzzleFile(object):
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.closed = False
+        self.map = None
+        self.offsets = []
+        if os.fstat(self.file.fileno()).st_size == 0:
+            return  # an empty file cannot be mapped
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.view = memoryview(self.map)
+        except TypeError:  # Python 2 maps only have the old buffer interface
+            self.view = None
+        size = len(self.map)
+        start = 0
+        while start < size:
+            end = self.map.find(b"\n", start)
+            if end < 0:
+                end = size
+            line_end = end - 1 if end > start and self.map[end - 1:end] == b"\r" else end
+            if line_end > start and self.map[start:start + 1] != b"#":
+                if line_end - start != CELL_COUNT:
+                    raise ValueError("Line at byte {0} of {1} is not a one-line 9x9 puzzle".format(start, path))
+                self.offsets.append(start)
+            start = end + 1
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def check_open(self):
+        if self.closed:
+            raise ValueError("I/O operation on closed PuzzleFile")
+
+    def __getitem__(self, index):
+        self.check_open()
+        start = self.offsets[index]
+        if self.view is None:
+            return buffer(self.map, start, CELL_COUNT)  # Python 2 only
+        return self.view[start:start + CELL_COUNT]
+
+    def __iter__(self):
+        self.check_open()
+        for index in range(len(self.offsets)):
+            yield self.state(index)
+
+    def state(self, index):
+        return parse_line(self[index])
+
+    # Unmaps the file, unless slices handed out are still alive: a map cannot close while
+    # exported, so it is then only dropped and unmapped once the last slice is gone.
+    def close(self):
+        self.closed = True
+        if self.map is not None:
+            if self.view is not None:
+                self.view.release()
+                self.view = None
+            try:
+                self.map.close()
+            except BufferError:
+                pass
+            self.map = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
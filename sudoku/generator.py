@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+import argparse
+import itertools
+import os
+import random
+import sys
+
+from CS3243_P2_Sudoku_13 import Sudoku, get_grid
+from batch import (add_solver_arguments, chunked, format_line, get_options, map_chunks, non_negative_int,
+                   positive_int, solve_puzzle)
+
+"""
+HOW IT WORKS:
+    ./generator.py corpus --count 10000 --seed 1 --jobs 0
+Writes 10000 puzzles to each of corpus/easy.txt, corpus/medium.txt, corpus/hard.txt and
+corpus/expert.txt, one 81-digit line per puzzle, ready for batch.py and benchmark.py --corpus.
+Every puzzle has exactly one solution. Puzzle i of a run depends only on the seed and i, so
+a run can be repeated exactly (with the same Python version: random.shuffle differs between
+Python 2 and 3) and --jobs only changes how fast it goes.
+    ./generator.py corpus --count 500 --bands hard,expert --inference mac
+Only fills the listed bands. A puzzle's band is the number of backtracks the solver needs
+for it, with the solver options given here (those of batch.py; the defaults otherwise), so
+grade with the configuration you mean to benchmark.
+
+How a puzzle is made: the boxes on the diagonal (three for 9x9, four for 16x16, ...) do not
+constrain each other, so they get random permutations and the DancingLinks engine completes
+the grid; the csp search is heavy-tailed on that task above 9x9. Clues are then removed in random
+order; a removal is undone when the puzzle would no longer have a unique solution. The
+result is minimal (no clue can go) unless --min-clues stops the removal earlier.
+Harder bands are rarer, so most of the run time goes into the last band to fill. Minimal
+puzzles above 9x9 are slow to check for uniqueness; use --min-clues for --box-size 4 and up.
+"""
+
+# Difficulty bands by the backtracks of the grading solve: (name, fewest, most or None)
+BANDS = (("easy", 0, 0), ("medium", 1, 49), ("hard", 50, 499), ("expert", 500, None))
+
+# options of the uniqueness checks; they count solutions, so only speed matters
+CHECK_OPTIONS = {"inference": "mac"}
+# options of the grid completion: on a grid with only the diagonal boxes filled, the csp search
+# can run for millions of nodes from 16x16 up, where DancingLinks takes a few hundred
+COMPLETE_OPTIONS = {"engine": "dlx"}
+
+
+def get_band(backtracks):
+    for name, fewest, most in BANDS:
+        if backtracks >= fewest and (most is None or backtracks <= most):
+            return name
+
+
+# a random complete grid: random permutations in the diagonal boxes, completed by DancingLinks
+def random_solution(rng, box_size=3):
+    grid = get_grid(box_size)
+    side = grid.side
+    puzzle = [[0] * side for _ in range(side)]
+    for box in range(0, side, box_size + 1):  # boxes 0, n + 1, 2n + 2, ... lie on the diagonal
+        values = list(grid.values)
+        rng.shuffle(values)
+        for cell, value in zip(grid.box_units[box], values):
+            puzzle[cell // side][cell % side] = value
+    return Sudoku(puzzle, verbose=False, **COMPLETE_OPTIONS).solve()
+
+
+# removes clues of `solution` in random order while the solution stays unique,
+# keeping at least `min_clues` of them
+def remove_clues(solution, rng, min_clues=0):
+    side = len(solution)
+    puzzle = [row[:] for row in solution]
+    cells = list(range(side * side))
+    rng.shuffle(cells)
+    clues = side * side
+    for cell in cells:
+        if clues <= min_clues:
+            break
+        (row, col) = divmod(cell, side)
+        value = puzzle[row][col]
+        puzzle[row][col] = 0
+        if Sudoku(puzzle, verbose=False, **CHECK_OPTIONS).count_solutions(2) == 1:
+            clues -= 1
+        else:
+            puzzle[row][col] = value
+    return puzzle
+
+
+# puzzle number `index` of the run seeded with `seed`; returns (index, puzzle, backtracks)
+def make_puzzle(index, seed=0, options=None, min_clues=0, box_size=3):
+    rng = random.Random(seed * 1000003 + index)
+    puzzle = remove_clues(random_solution(rng, box_size), rng, min_clues)
+    ans, stats = solve_puzzle(puzzle, options)
+    return index, puzzle, stats["backtracks"]
+
+
+# runs in a worker process
+def make_chunk(indices, seed, options, min_clues, box_size):
+    return [make_puzzle(index, seed, options, min_clues, box_size) for index in indices]
+
+
+# Yields (band, puzzle) until every band in `counts` (band name -> wanted puzzles) is full or
+# `max_puzzles` puzzles have been made. Puzzles for full bands are dropped.
+def generate(counts, seed=0, options=None, min_clues=0, box_size=3, processes=1, max_puzzles=None):
+    missing = dict(counts)
+    if not any(wanted > 0 for wanted in missing.values()):
+        return  # nothing to fill; the loop below would never stop
+    indices = itertools.count() if max_puzzles is None else iter(range(max_puzzles))
+    args = (seed, options, min_clues, box_size)
+    if processes == 1:
+        results = (make_puzzle(index, *args) for index in indices)
+    else:
+        results = map_chunks(make_chunk, chunked(indices, 4), args, processes or None)
+    for index, puzzle, backtracks in results:
+        band = get_band(backtracks)
+        if missing.get(band, 0) > 0:
+            missing[band] -= 1
+            yield band, puzzle
+            if not any(missing.values()):
+                break
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Generate uniquely solvable puzzles graded into difficulty bands.")
+    parser.add_argument("directory", help="output directory; one <band>.txt file per band")
+    parser.add_argument("--count", type=positive_int, default=100, help="puzzles per band (default: 100)")
+    parser.add_argument("--bands", default=",".join(name for name, fewest, most in BANDS),
+                        help="comma-separated bands to fill (default: all)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-clues", type=int, default=0, help="stop removing clues at this many")
+    parser.add_argument("--max-puzzles", type=int, help="give up after making this many puzzles")
+    parser.add_argument("--box-size", type=int, default=3, help="3 for 9x9 (default), 4 for 16x16, ...")
+    parser.add_argument("-j", "--jobs", type=non_negative_int, default=1,
+                        help="worker processes; 0 uses every core, 1 (default) works in this process")
+    add_solver_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    bands = [band for band in args.bands.split(",") if band]
+    for band in bands:
+        if band not in [name for name, fewest, most in BANDS]:
+            raise ValueError("Unknown band {0!r}, expected one of {1}".format(
+                band, tuple(name for name, fewest, most in BANDS)))
+    if not os.path.isdir(args.directory):
+        os.makedirs(args.directory)
+
+    outputs = dict((band, open(os.path.join(args.directory, band + ".txt"), "w")) for band in bands)
+    written = dict((band, 0) for band in bands)
+    try:
+        for band, puzzle in generate(dict((band, args.count) for band in bands), args.seed, get_options(args),
+                                     args.min_clues, args.box_size, args.jobs, args.max_puzzles):
+            outputs[band].write(format_line(puzzle) + "\n")
+            written[band] += 1
+    finally:
+        for f in outputs.values():
+            f.close()
+    sys.stderr.write(", ".join("{0}: {1}".format(band, written[band]) for band in bands) + "\n")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
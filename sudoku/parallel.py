@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+
+import argparse
+import multiprocessing
+import sys
+import time
+
+from CS3243_P2_Sudoku_13 import Sudoku
+from batch import (add_solver_arguments, format_grid, get_options, non_negative_int, open_input, open_output,
+                   positive_int, read_puzzles)
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+"""
+HOW IT WORKS:
+    ./parallel.py input25.txt output25.txt --box-size 5 --jobs 0
+Searches one puzzle (the first in the input, in any format batch.py reads) with one worker
+process per core (or --jobs N) and writes the first solution found like
+CS3243_P2_Sudoku_13.py does. Nodes and time go to stderr.
+    ./parallel.py input16.txt --box-size 4 --count-solutions 1000
+Counts the solutions instead, up to the limit, and prints the count.
+
+How the work is shared: a work unit is a list of (cell, value) decisions on top of the
+puzzle, searched by a Sudoku that takes them as givens; the run starts with the empty unit.
+Workers search in slices of --slice-nodes nodes. After a slice, a worker that sees idle
+workers hands them the untried values of its shallowest search frame that has any, each
+value with the assignments of the frames below it as a new unit, and drops those values
+from its own frame. Shallow frames root the largest subtrees, so one steal keeps an idle
+worker busy for long. The run ends with the first solution, or when every unit is done
+(or the count reached its limit) when counting. Takes the csp solver options of batch.py;
+restarts do not apply, as every unit is searched to the end.
+"""
+
+
+# the puzzle with the (cell, value) `decisions` filled in as givens
+def apply_decisions(puzzle, decisions):
+    side = len(puzzle)
+    grid = [row[:] for row in puzzle]
+    for cell, value in decisions:
+        grid[cell // side][cell % side] = value
+    return grid
+
+
+# Moves the untried values of the shallowest frame of `sudoku` that has any into new work units
+# on `tasks`; `outstanding` counts them before they are queued. Returns the number of units.
+def donate(sudoku, decisions, tasks, outstanding):
+    for depth, frame in enumerate(sudoku.stack):
+        (variable, values, index) = frame[:3]
+        if index < len(values):
+            prefix = decisions + [(below[0], sudoku.state[below[0]]) for below in sudoku.stack[:depth]]
+            units = [prefix + [(variable, value)] for value in values[index:]]
+            frame[1] = values[:index]
+            with outstanding.get_lock():
+                outstanding.value += len(units)
+            for unit in units:
+                tasks.put(unit)
+            return len(units)
+    return 0
+
+
+# Runs in a worker process: searches units from `tasks` until `stop` is set. Puts
+# ("solution", answer, nodes) for the first solution of a unit, or when `counting`
+# ("solutions", count, nodes) once a slice's worth of nodes found some, and ("done", count,
+# nodes) when a unit is finished. Counts and nodes are those since the last message, so
+# counting never sends grids.
+def run_worker(puzzle, options, counting, slice_nodes, tasks, results, outstanding, hungry, stop):
+    while not stop.is_set():
+        with hungry.get_lock():
+            hungry.value += 1
+        decisions = None
+        while decisions is None and not stop.is_set():
+            try:
+                decisions = tasks.get(timeout=0.01)
+            except queue.Empty:
+                pass
+        with hungry.get_lock():
+            hungry.value -= 1
+        if decisions is None:
+            return
+
+        sudoku = Sudoku(apply_decisions(puzzle, decisions), verbose=False, **options)
+        sudoku.prepare()
+        reported = 0
+        found = 0
+        while not stop.is_set():
+            result = sudoku.backtrack(slice_nodes)
+            if result is None or (found and sudoku.counter - reported >= slice_nodes):
+                if found:
+                    results.put(("solutions", found, sudoku.counter - reported))
+                    (reported, found) = (sudoku.counter, 0)
+                if result is None and hungry.value > 0:
+                    donate(sudoku, decisions, tasks, outstanding)
+            if result is None:
+                continue
+            if not result:
+                break
+            if not counting:
+                results.put(("solution", sudoku.unflatten(result), sudoku.counter - reported))
+                reported = sudoku.counter
+                break
+            found += 1
+            sudoku.skip_solution()
+        results.put(("done", found, sudoku.counter - reported))
+
+
+# Searches `puzzle` with `processes` workers (all cores when None). Returns (answer or None,
+# nodes), or with `count_limit` (None counts all of them) and counting=True (count, nodes).
+def solve_parallel(puzzle, options=None, processes=None, counting=False, count_limit=None, slice_nodes=500):
+    options = dict(options or {})
+    if options.get("engine", "csp") != "csp":
+        raise ValueError("Parallel search needs the csp engine")
+    if count_limit is not None and count_limit < 1:
+        raise ValueError("count_limit must be at least 1, got {0}".format(count_limit))
+    if slice_nodes < 1:
+        raise ValueError("slice_nodes must be at least 1, got {0}".format(slice_nodes))
+    options["restarts"] = "none"
+    Sudoku(puzzle, verbose=False, **options)  # raises on bad options here rather than in every worker
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    tasks = multiprocessing.Queue()
+    results = multiprocessing.Queue()
+    outstanding = multiprocessing.Value("i", 1)  # the root unit
+    hungry = multiprocessing.Value("i", 0)
+    stop = multiprocessing.Event()
+    workers = [multiprocessing.Process(target=run_worker, args=(puzzle, options, counting, slice_nodes, tasks,
+                                                                results, outstanding, hungry, stop))
+               for _ in range(processes)]
+    ans = None
+    count = 0
+    nodes = 0
+    try:
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        tasks.put([])
+        while True:
+            try:
+                (kind, payload, unit_nodes) = results.get(timeout=0.1)
+            except queue.Empty:
+                # workers only exit once `stop` is set, so an exit now lost its unit for good
+                if any(worker.exitcode for worker in workers):
+                    raise RuntimeError("A worker of the parallel search failed")
+                continue
+            nodes += unit_nodes
+            if kind == "solution":
+                ans = payload
+                break
+            count += payload
+            if count_limit is not None and count >= count_limit:
+                count = count_limit  # workers report in batches, so they may overshoot
+                break
+            if kind == "done":
+                # units are counted in before they are queued, so zero means every unit is done
+                with outstanding.get_lock():
+                    outstanding.value -= 1
+                    if outstanding.value == 0:
+                        break
+    finally:
+        stop.set()
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        for worker in workers:
+            worker.join()
+    return (count if counting else ans), nodes
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Search one puzzle with several worker processes.")
+    parser.add_argument("input", help="puzzle file; the first puzzle in it is solved; - for stdin")
+    parser.add_argument("output", nargs="?", help="answer file (default: stdout)")
+    parser.add_argument("--box-size", type=int, default=3, help="3 for 9x9 (default), 4 for 16x16, ...")
+    parser.add_argument("-j", "--jobs", type=non_negative_int, default=0, help="worker processes; 0 (default) uses every core")
+    parser.add_argument("--count-solutions", type=positive_int, metavar="LIMIT",
+                        help="print the number of solutions, counting up to LIMIT, instead of a solution")
+    parser.add_argument("--slice-nodes", type=positive_int, default=500,
+                        help="nodes a worker searches between checks for idle workers (default: 500)")
+    add_solver_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.engine != "csp":
+        parser.error("parallel search needs the csp engine")
+    return args
+
+
+def main(argv):
+    args = parse_args(argv)
+    puzzles_file = open_input(args.input)
+    puzzle = next(read_puzzles(puzzles_file, args.box_size))
+    if puzzles_file is not sys.stdin:
+        puzzles_file.close()
+    counting = args.count_solutions is not None
+
+    start = time.time()
+    ans, nodes = solve_parallel(puzzle, get_options(args), args.jobs or None, counting, args.count_solutions,
+                                args.slice_nodes)
+    end = time.time()
+
+    sys.stderr.write("{0} nodes in {1:.3f}s ({2} process(es))\n".format(
+        nodes, end - start, args.jobs or multiprocessing.cpu_count()))
+    output = open_output(args.output)
+    if counting:
+        output.write("{0}\n".format(ans))
+    elif ans is None:
+        sys.stderr.write("The puzzle has no solution\n")
+    else:
+        output.write(format_grid(ans))
+    if output is not sys.stdout:
+        output.close()
+    return 0 if counting or ans is not None else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+import argparse
+import multiprocessing
+import sys
+import time
+
+from CS3243_P2_Sudoku_13 import Sudoku
+from batch import format_grid, non_negative_int, open_input, open_output, read_puzzles
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+"""
+HOW IT WORKS:
+    ./portfolio.py input.txt output.txt
+Solves one puzzle (the first in input.txt, in any format batch.py reads) with several solver
+configurations at once, one process each: mrv with forward checking, mrv with MAC, dom/wdeg,
+and --seeds restarting searches with random tie-breaks. The first configuration to finish
+answers and the others are terminated, so a puzzle that is hard for one configuration
+finishes at the speed of the best one for it. The answer is written like
+CS3243_P2_Sudoku_13.py writes it; the winning configuration and the time go to stderr.
+    ./portfolio.py input16.txt --box-size 4 --seeds 4 --timeout 10
+Races 7 configurations on a 16x16 puzzle and gives up after 10 seconds.
+The configurations share the machine: with fewer cores than configurations the race runs
+time-sliced, and one process start per configuration is paid on every puzzle, so use it for
+single hard puzzles rather than for batches (batch.py --jobs is for those).
+"""
+
+# the fixed configurations; get_portfolio adds the randomized ones
+PORTFOLIO = (
+    {"inference": "fc"},
+    {"inference": "mac"},
+    {"variable_ordering": "dom/wdeg"},
+)
+
+
+# PORTFOLIO plus `seeds` restarting searches with random tie-breaks (seeds 1, 2, ...)
+def get_portfolio(seeds=2):
+    return list(PORTFOLIO) + [{"restarts": "luby", "seed": seed} for seed in range(1, seeds + 1)]
+
+
+# runs in a racing process; puts (index, answer or None, stats) on `results`
+def run_configuration(index, puzzle, options, results):
+    sudoku = Sudoku(puzzle, verbose=False, **options)
+    result = sudoku.search()
+    results.put((index, sudoku.unflatten(result) if result else None, sudoku.stats))
+
+
+# Races one process per configuration (Sudoku keyword arguments) on `puzzle` and terminates
+# the rest once one finishes. Returns the winner's (index, answer or None, stats); the answer
+# is None when the puzzle has no solution. Returns None when `timeout` seconds pass first.
+def solve_portfolio(puzzle, configurations, timeout=None):
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=run_configuration, args=(index, puzzle, options, results))
+                 for index, options in enumerate(configurations)]
+    deadline = None if timeout is None else time.time() + timeout
+    try:
+        for process in processes:
+            process.daemon = True
+            process.start()
+        while deadline is None or time.time() < deadline:
+            try:
+                return results.get(timeout=0.01)
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes):
+                    # a result put just before its process exited may still be in the pipe
+                    try:
+                        return results.get(timeout=0.1)
+                    except queue.Empty:
+                        raise RuntimeError("Every configuration of the portfolio failed")
+        return None
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Solve one puzzle by racing solver configurations.")
+    parser.add_argument("input", help="puzzle file; the first puzzle in it is solved; - for stdin")
+    parser.add_argument("output", nargs="?", help="answer file (default: stdout)")
+    parser.add_argument("--box-size", type=int, default=3, help="3 for 9x9 (default), 4 for 16x16, ...")
+    parser.add_argument("--seeds", type=non_negative_int, default=2,
+                        help="randomized restarting configurations (default: 2)")
+    parser.add_argument("--timeout", type=float, help="give up after this many seconds")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    puzzles_file = open_input(args.input)
+    puzzle = next(read_puzzles(puzzles_file, args.box_size))
+    if puzzles_file is not sys.stdin:
+        puzzles_file.close()
+    configurations = get_portfolio(args.seeds)
+
+    start = time.time()
+    winner = solve_portfolio(puzzle, configurations, args.timeout)
+    end = time.time()
+
+    if winner is None:
+        sys.stderr.write("No configuration finished within {0}s\n".format(args.timeout))
+        return 1
+    (index, ans, stats) = winner
+    sys.stderr.write("{0} won after {1:.3f}s ({2} nodes)\n".format(configurations[index], end - start, stats["nodes"]))
+    if ans is None:
+        sys.stderr.write("The puzzle has no solution\n")
+        return 1
+    output = open_output(args.output)
+    output.write(format_grid(ans))
+    if output is not sys.stdout:
+        output.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+import argparse
+import random
+import sys
+import time
+
+from CS3243_P2_Sudoku_13 import ENGINES, PROPAGATION_STAGES, Sudoku, get_grid
+from batch import is_solution
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+"""
+HOW IT WORKS:
+    ./scaling.py
+Generates puzzles of every box size from 3 (9x9) to 6 (36x36), solves them and prints one
+line per size: median and worst solve time, median node count, how many puzzles were not
+solved within the node limit and the peak memory of a solve (Python 3 only, via tracemalloc,
+in a separate run of the first puzzle so that tracing does not slow the timed solves).
+    ./scaling.py --box-sizes 3,4 --puzzles 50 --seed 7 --propagation all
+Puzzles come from a pattern solution that is shuffled (digits, rows within bands, bands,
+columns within stacks, stacks, transpose) and then loses each clue with probability
+1 - --clues, so the same seed always measures the same puzzles.
+"""
+
+
+# a solved side x side grid: the standard pattern, which is a valid solution for any box size
+def get_pattern(box_size):
+    side = box_size * box_size
+    return [[(box_size * (row % box_size) + row // box_size + col) % side + 1 for col in range(side)]
+            for row in range(side)]
+
+
+# applies a random validity-preserving transformation to a solved grid
+def shuffle_solution(solution, box_size, rng):
+    side = box_size * box_size
+    digits = list(range(1, side + 1))
+    rng.shuffle(digits)
+    bands = list(range(box_size))
+    rng.shuffle(bands)
+    rows = [band * box_size + row for band in bands for row in rng.sample(range(box_size), box_size)]
+    stacks = list(range(box_size))
+    rng.shuffle(stacks)
+    cols = [stack * box_size + col for stack in stacks for col in rng.sample(range(box_size), box_size)]
+    grid = [[digits[solution[row][col] - 1] for col in cols] for row in rows]
+    if rng.random() < 0.5:
+        grid = [list(row) for row in zip(*grid)]
+    return grid
+
+
+# keeps every clue of a shuffled solution with probability `clues`
+def make_puzzle(box_size, clues, rng):
+    solution = shuffle_solution(get_pattern(box_size), box_size, rng)
+    return [[value if rng.random() < clues else 0 for value in row] for row in solution]
+
+
+# solves `puzzle` within at most `max_nodes` search nodes (csp engine only); returns (sudoku, result)
+def solve(puzzle, options, max_nodes):
+    sudoku = Sudoku(puzzle, verbose=False, **options)
+    if options.get("engine", "csp") == "csp":
+        sudoku.prepare()
+        return sudoku, sudoku.backtrack(max_nodes)
+    return sudoku, sudoku.search()
+
+
+# returns (solved, nodes, seconds)
+def measure(puzzle, options, max_nodes):
+    start = time.time()
+    sudoku, result = solve(puzzle, options, max_nodes)
+    end = time.time()
+    solved = bool(result) and is_solution(puzzle, sudoku.unflatten(result))
+    return solved, sudoku.counter, end - start
+
+
+# peak bytes allocated while solving `puzzle`, or None without tracemalloc
+def measure_memory(puzzle, options, max_nodes):
+    if tracemalloc is None:
+        return None
+    tracemalloc.start()
+    try:
+        solve(puzzle, options, max_nodes)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def median(values):
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Measure solve time and memory from 9x9 up to 36x36.")
+    parser.add_argument("--box-sizes", default="3,4,5,6", help="comma-separated box sizes (default: 3,4,5,6)")
+    parser.add_argument("--puzzles", type=int, default=10, help="puzzles per box size")
+    parser.add_argument("--clues", type=float, default=0.7, help="fraction of cells given (default: 0.7)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-nodes", type=int, default=20000, help="search nodes before a puzzle is given up")
+    parser.add_argument("--engine", choices=ENGINES, default="csp", help="solver engine (default: csp)")
+    parser.add_argument("--propagation", default="naked_singles,hidden_singles",
+                        help="comma-separated propagation stages, or `all`: " + ",".join(PROPAGATION_STAGES))
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    if args.propagation == "all":
+        propagation = PROPAGATION_STAGES
+    else:
+        propagation = tuple(stage for stage in args.propagation.split(",") if stage)
+    options = {"engine": args.engine, "propagation": propagation}
+    rng = random.Random(args.seed)
+
+    print("{0:>7} {1:>10} {2:>10} {3:>10} {4:>8} {5:>10}".format(
+        "size", "median s", "max s", "nodes", "unsolved", "peak KiB"))
+    for box_size in [int(size) for size in args.box_sizes.split(",")]:
+        side = box_size * box_size
+        get_grid(box_size)  # table set-up is paid once per size, not per puzzle
+        puzzles = [make_puzzle(box_size, args.clues, rng) for _ in range(args.puzzles)]
+        results = [measure(puzzle, options, args.max_nodes) for puzzle in puzzles]
+        peak = measure_memory(puzzles[0], options, args.max_nodes)
+        print("{0:>7} {1:>10.4f} {2:>10.4f} {3:>10} {4:>8} {5:>10}".format(
+            "{0}x{0}".format(side),
+            median([seconds for (solved, nodes, seconds) in results]),
+            max([seconds for (solved, nodes, seconds) in results]),
+            median([nodes for (solved, nodes, seconds) in results]),
+            len([solved for (solved, nodes, seconds) in results if not solved]),
+            "n/a" if peak is None else "{0:.0f}".format(peak / 1024.0)))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
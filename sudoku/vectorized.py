@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+
+import argparse
+import sys
+import time
+
+from CS3243_P2_Sudoku_13 import get_grid
+from batch import (add_solver_arguments, chunked, format_line, get_options, open_input, open_output, positive_int,
+                   read_puzzles, solve_puzzle, write_results)
+
+try:
+    import numpy
+except ImportError:  # optional: only this tool needs it
+    numpy = None
+
+"""
+HOW IT WORKS:
+    ./vectorized.py puzzles.txt solutions.txt --stats stats.jsonl
+Solves the puzzles of a batch.py corpus like batch.py does, 4096 at a time (--batch-size):
+each block is an (N, 81) uint8 NumPy array, and naked and hidden singles are applied to the
+whole block at once with array operations until no puzzle changes. Puzzles the singles
+solve or prove unsolvable never reach a per-cell Python loop; only the rest go to the csp
+search, from the cells the singles filled in, with the solver options of batch.py. The
+stats line of a puzzle has "singles": true when the singles alone decided it, and the
+search stats otherwise. Needs NumPy; takes --box-size like batch.py.
+
+One round, for every puzzle still changing: the used digits of every unit are the bitwise
+OR over its cells, a cell's candidates are the digits not used in any of its units, and for
+every digit a cell gets it when it is the cell's only candidate (naked single) or the only
+cell of one of its units that can take it (hidden single). A unit with a repeated digit or
+an empty cell without candidates means the puzzle has no solution.
+"""
+
+
+# index tables of the grid for `box_size`: the cells of every unit (unit, cell in unit) and
+# the units of every cell (cell, row/column/box)
+def get_tables(box_size):
+    grid = get_grid(box_size)
+    side = grid.side
+    units = numpy.array(grid.units, dtype=numpy.intp)
+    cell_units = numpy.array([(grid.row_of[cell], side + grid.col_of[cell], 2 * side + grid.box_of[cell])
+                              for cell in grid.cells], dtype=numpy.intp)
+    return units, cell_units
+
+
+# number of set bits of every mask below 1 << `side`
+def count_bits(masks, side):
+    counts = numpy.zeros(masks.shape, dtype=numpy.int64)
+    for shift in range(side):
+        counts += (masks >> shift) & 1
+    return counts
+
+
+# Applies naked and hidden singles to every puzzle of `cells`, an (N, cell count) uint8 array
+# changed in place, until none changes. Returns an int8 array: 1 for a solved puzzle, -1 for
+# one without solution and 0 for one the singles leave open.
+def propagate_singles(cells, box_size):
+    grid = get_grid(box_size)
+    side = grid.side
+    (units, cell_units) = get_tables(box_size)
+    value_bits = numpy.array(grid.value_bit, dtype=numpy.int64)
+    status = numpy.zeros(len(cells), dtype=numpy.int8)
+    active = numpy.arange(len(cells))
+    while active.size:
+        block = cells[active]
+        empty = block == 0
+        used = numpy.bitwise_or.reduce(value_bits[block][:, units], axis=2)
+        repeated = (count_bits(used, side) != (~empty)[:, units].sum(axis=2)).any(axis=1)
+        candidates = grid.all_values & ~(used[:, cell_units[:, 0]] | used[:, cell_units[:, 1]] |
+                                         used[:, cell_units[:, 2]])
+        candidates[~empty] = 0
+        dead = repeated | (empty & (candidates == 0)).any(axis=1)
+        solved = ~dead & ~empty.any(axis=1)
+
+        changed = numpy.zeros(len(block), dtype=bool)
+        for value in grid.values:
+            bit = grid.value_bit[value]
+            naked = candidates == bit
+            holders = (candidates & bit) != 0
+            only_holder = holders[:, units].sum(axis=2) == 1
+            hidden = holders & only_holder[:, cell_units].any(axis=2)
+            # a puzzle without solution may get clashing singles; the next round finds the clash
+            assign = (naked | hidden) & ~dead[:, None]
+            block[assign] = value
+            changed |= assign.any(axis=1)
+
+        cells[active] = block
+        status[active[dead]] = -1
+        status[active[solved]] = 1
+        active = active[changed]
+    return status
+
+
+# yields (index, answer or None, stats) for every puzzle in input order, like batch.solve_batch
+def solve_batch(puzzles, box_size=3, options=None, batch_size=4096):
+    if numpy is None:
+        raise ImportError("vectorized.py needs NumPy")
+    side = box_size * box_size
+    index = 0
+    for chunk in chunked(puzzles, batch_size):
+        cells = numpy.array(chunk, dtype=numpy.uint8).reshape(len(chunk), side * side)
+        status = propagate_singles(cells, box_size)
+        for row, puzzle_status in zip(cells, status):
+            state = row.tolist()
+            grid = [state[start:start + side] for start in range(0, side * side, side)]
+            if puzzle_status == 0:
+                # the singles are forced moves, so the search starts from the grid they left
+                ans, stats = solve_puzzle(grid, options)
+                stats["singles"] = False
+            else:
+                solved = bool(puzzle_status == 1)
+                ans, stats = (grid if solved else None), {"singles": True, "solved": solved}
+            stats["index"] = index
+            yield index, ans, stats
+            index += 1
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Solve a file of puzzles with vectorized singles first.")
+    parser.add_argument("input", help="puzzle file in a format batch.py reads; - for stdin")
+    parser.add_argument("output", nargs="?", help="solution file (default: stdout)")
+    parser.add_argument("--box-size", type=int, default=3, help="3 for 9x9 (default), 4 for 16x16, ...")
+    parser.add_argument("--stats", help="write one JSON line of stats per puzzle to this file")
+    parser.add_argument("--batch-size", type=positive_int, default=4096, help="puzzles per array (default: 4096)")
+    add_solver_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    puzzles_file = open_input(args.input)
+    output = open_output(args.output)
+    stats_output = open(args.stats, "w") if args.stats else None
+    results = solve_batch(read_puzzles(puzzles_file, args.box_size), args.box_size, get_options(args),
+                          args.batch_size)
+
+    start = time.time()
+    count, solved = write_results(results, output, stats_output, format_line)
+    end = time.time()
+
+    for f in (puzzles_file, output, stats_output):
+        if f not in (None, sys.stdin, sys.stdout):
+            f.close()
+    elapsed = end - start
+    sys.stderr.write("Solved {0}/{1} puzzles in {2:.3f}s ({3:.1f} puzzles/s)\n".format(
+        solved, count, elapsed, count / elapsed if elapsed > 0 else 0.0))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])